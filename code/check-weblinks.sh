@@ -15,8 +15,9 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 #
-# Using linkchecker to verify that all links on the Outreachy webpage are valid.
-# https://wummel.github.io/linkchecker/
+# Verify that all links on the Outreachy webpage are valid, including links
+# to other websites. See outreachylinkcheck.py to check the Markdown pages
+# before they're published, or to skip the external links.
 # The first argument is the path to the directory where the html pages can be found.
 
-linkchecker -r1 `find $1 -iname '*.html' | xargs`
+`dirname $0`/outreachylinkcheck.py --external "$1"
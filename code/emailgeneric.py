@@ -19,31 +19,66 @@
 
 import argparse
 import os
+from emailtemplate import emailTemplate, word_placeholders
+from emailsend import add_send_arguments, send_drafts
+from outreachcontacts import add_contacts_arguments, open_contacts
+
+def read_contacts(contactsFile):
+    """Yield each contact line, skipping # comments."""
+    for row in contactsFile:
+        if not row[0] == '#':
+            yield row
 
 def main():
     parser = argparse.ArgumentParser(description='Send a generic email to a list of receipents with a personal greeting')
-    parser.add_argument('email', help='email text template')
+    parser.add_argument('email', help='email text template, with {{NAME}} where the given name goes')
     parser.add_argument('contacts', help='CSV file of people who stopped by the booth')
     parser.add_argument('outdir', help='Directory to create form emails in')
+    add_send_arguments(parser)
+    add_contacts_arguments(parser)
     args = parser.parse_args()
 
     if not os.path.exists(args.outdir):
         os.makedirs(args.outdir)
 
-    tosend = []
-    with open(args.contacts, 'r') as contactsFile:
-        for row in contactsFile:
-            if not row[0] == '#':
-                tosend.append(row)
+    with open(args.email, 'r') as emailFile:
+        text = emailFile.read()
+    template = emailTemplate(text)
+    # Older templates use a bare NAME as the placeholder.
+    if not template.names:
+        template = emailTemplate(text, word_placeholders(['NAME']))
 
-    for index, contact in enumerate(tosend):
-        with open(args.email, 'r') as emailFile:
+    # Contacts are read and drafts written one at a time, so memory use
+    # doesn't grow with the contact list. Draft paths are only kept if
+    # they need to be sent.
+    store = open_contacts(args)
+    if store:
+        with open(args.contacts, 'r') as contactsFile:
+            store.add(read_contacts(contactsFile), args.contacts)
+
+    drafts = []
+    written = 0
+    skipped = 0
+    with open(args.contacts, 'r') as contactsFile:
+        for index, contact in enumerate(read_contacts(contactsFile)):
+            if store and store.emailed(contact):
+                skipped += 1
+                continue
             given_name = contact.split(' ')[0]
-            body = emailFile.read().replace('NAME', given_name)
-            with open(os.path.join(args.outdir, str(index) + '.txt'), 'w') as email:
-                email.write('To: ' + contact)
-                email.write(body)
-    print('Wrote', len(tosend), 'resume draft emails to', args.outdir)
+            path = os.path.join(args.outdir, str(index) + '.txt')
+            with open(path, 'w') as email:
+                email.write('To: ' + contact + template.render({'NAME': given_name}))
+            written += 1
+            if args.smtphost:
+                drafts.append(path)
+            if store:
+                store.written(contact, path)
+    print('Wrote', written, 'resume draft emails to', args.outdir)
+    if skipped:
+        print('Skipped', skipped, 'people who were already emailed this round')
+    send_drafts(args, drafts, store.on_result if store else None)
+    if store:
+        store.close()
 
 if __name__ == "__main__":
     main()
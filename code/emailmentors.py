@@ -17,6 +17,10 @@
 import argparse
 import os
 import csv
+import json
+import re
+from emailtemplate import emailTemplate, word_placeholders, content_hash, draftManifest
+from emailsend import add_send_arguments, send_drafts
 
 header1 = '''From: Outreachy Organizers <organizers@outreachy.org>
 '''
@@ -39,6 +43,126 @@ class CohortPair:
                 'Intern: ' + self.intern_contact + '\n' + \
                 'Mentor(s): ' + self.mentor_contacts
 
+# Splits a line of contacts on the commas between them. Commas inside a
+# quoted name ("Sharp, Sage" <sharp@otter.technology>) or inside the
+# <email> part don't split.
+contact_pattern = re.compile(r'(?:"[^"]*"|<[^>]*>|[^,"<])+')
+
+def split_contacts(line):
+    contacts = []
+    for contact in contact_pattern.findall(line):
+        contact = contact.strip()
+        if contact != '':
+            contacts.append(contact)
+    return contacts
+
+def contact_name(contact):
+    return contact.split('<', 1)[0].strip().strip('"')
+
+def given_name(contact):
+    name = contact_name(contact)
+    # Quoted names are usually written "Family, Given"
+    if ',' in name:
+        name = name.split(',', 1)[1].strip()
+    return name.split(' ')[0]
+
+def read_cohort_pairs(contactsFile, offsets=None, only_community=None):
+    """Yield a CohortPair for each intern in a contacts file opened in binary mode.
+
+    If offsets is a dict, the byte offset of each '# COMMUNITY' line is
+    stored in it as the file is read. If only_community is set, reading
+    stops at the next community's section, so the file can be seeked to
+    the start of one community and only that community is parsed."""
+    community = ''
+    coordinators = []
+    section = None
+    while True:
+        offset = contactsFile.tell()
+        line = contactsFile.readline()
+        if line == b'':
+            break
+        line = line.decode('utf-8')
+        if line.startswith('#'):
+            name = line.lstrip('# ').strip()
+            if only_community is not None and community != '' and name != only_community:
+                break
+            community = name
+            coordinators = []
+            section = None
+            if offsets is not None:
+                offsets[community] = offset
+        elif line.startswith('Coordinators:'):
+            section = 'coordinators'
+        elif line.startswith('Unpaired mentors:'):
+            # Unpaired mentors don't get an email
+            section = None
+        elif line.startswith('Mentor'):
+            section = 'pairs'
+        elif section == 'coordinators':
+            coordinators.extend(split_contacts(line))
+        elif section == 'pairs':
+            contacts = split_contacts(line)
+            if not contacts:
+                continue
+            yield CohortPair(
+                community,
+                ', '.join(coordinators),
+                contacts[0],
+                ', '.join(contacts[1:]))
+
+def community_offsets_path(outdir):
+    # Kept with the drafts and their manifest, not next to the contacts
+    # file, which may be somewhere we shouldn't (or can't) write.
+    return os.path.join(outdir, '.offsets.json')
+
+def load_community_offsets(contacts, outdir):
+    """Return the saved byte offset of each community in the contacts file,
+    or None if the contacts file changed since the offsets were saved."""
+    try:
+        with open(community_offsets_path(outdir), 'r') as offsetsFile:
+            saved = json.load(offsetsFile)
+    except (OSError, ValueError):
+        return None
+    stat = os.stat(contacts)
+    if (saved.get('contacts') != os.path.abspath(contacts) or
+            saved.get('size') != stat.st_size or saved.get('mtime') != stat.st_mtime):
+        return None
+    return saved['offsets']
+
+def save_community_offsets(contacts, outdir, offsets):
+    """Save the offsets for the next run. They're only a speed-up, so
+    failing to save them isn't an error."""
+    stat = os.stat(contacts)
+    try:
+        with open(community_offsets_path(outdir), 'w') as offsetsFile:
+            json.dump({'contacts': os.path.abspath(contacts), 'size': stat.st_size,
+                       'mtime': stat.st_mtime, 'offsets': offsets}, offsetsFile)
+    except OSError as e:
+        print('Could not save the community offsets of', contacts + ':', e)
+
+def community_pairs(contacts, outdir, community):
+    """Yield the CohortPairs for one community, seeking straight to its
+    section when the offsets of the contacts file are already known."""
+    offsets = load_community_offsets(contacts, outdir)
+    with open(contacts, 'rb') as contactsFile:
+        if offsets is None:
+            offsets = {}
+            for pair in read_cohort_pairs(contactsFile, offsets):
+                if pair.community == community:
+                    yield pair
+            save_community_offsets(contacts, outdir, offsets)
+            return
+        if community not in offsets:
+            return
+        contactsFile.seek(offsets[community])
+        yield from read_cohort_pairs(contactsFile, only_community=community)
+
+def all_pairs(contacts, outdir):
+    offsets = {}
+    with open(contacts, 'rb') as contactsFile:
+        yield from read_cohort_pairs(contactsFile, offsets)
+    save_community_offsets(contacts, outdir, offsets)
+
 def main():
     parser = argparse.ArgumentParser(description='Generate several text-based emails to a mentor about their intern')
     parser.add_argument('outdir', help='Directory to create draft emails in')
@@ -54,69 +178,50 @@ def main():
             '  mentor1 <email@example.com>,\n' + \
             'Mentor-intern pairs:\n' + \
             '  intern1 <email@example.com>, mentor2 <email@example.com>, mentor3 <email@example.com>' + \
-            '  intern2 <email@example.com>, mentor4 <email@example.com>',
-            type=argparse.FileType('r')
+            '  intern2 <email@example.com>, mentor4 <email@example.com>\n' + \
+            'Names with commas in them must be quoted: "Sharp, Sage" <email@example.com>'
             )
+    parser.add_argument('--community', help='Only write drafts for interns in this community')
+    add_send_arguments(parser)
     args = parser.parse_args()
 
     if not os.path.exists(args.outdir):
         os.makedirs(args.outdir)
 
-    community = ''
-    coordinator = ''
-    # list of CohortPairs
-    cohort_pairs = []
-    while True:
-        line = args.contacts.readline()
-        community = line.lstrip('# ').strip()
-        line = args.contacts.readline()
-        line = args.contacts.readline()
-        coordinators = line.strip()
-        line = args.contacts.readline()
-        # Ignore any unpaired mentors
-        if line.startswith('Unpaired mentors:'):
-            while True:
-                line = args.contacts.readline()
-                if line.startswith('Mentor') or line.startswith('#'):
-                    break
-        if line.startswith('#'):
-            continue
-        if line == '':
-            break
-        # Parse intern-mentor pairings
-        while True:
-            line = args.contacts.readline()
-            if line == '' or line == '\n':
-                break
-            # assuming no commas in the names - switch to tabs or | later
-            pair_list = line.split(',', 1)
-            if len(pair_list) < 2:
-                mentor = ''
-            else:
-                mentor = pair_list[1].strip()
-            cohort_pairs.append(CohortPair(
-                community,
-                coordinators,
-                pair_list[0].strip(),
-                mentor
-                ))
-        if line == '':
-            break
+    body_text = args.body.read()
+    body = emailTemplate(body_text, word_placeholders(['INTERN', 'COMMUNITY', 'COORDINATOR'], '$'))
+    # Only drafts whose contacts or email text changed since the last run
+    # into outdir are rewritten.
+    manifest = draftManifest(args.outdir)
+    template = content_hash(header1, body_text, signature, str(args.coordinator), str(args.intern))
+    if args.community:
+        cohort_pairs = community_pairs(args.contacts, args.outdir, args.community)
+    else:
+        cohort_pairs = all_pairs(args.contacts, args.outdir)
 
-    body = args.body.read()
+    drafts = []
+    written = 0
+    unchanged = 0
     for pair in cohort_pairs:
-        intern_name = pair.intern_contact.split('<', 1)[0].strip()
-        filename = intern_name.replace(' ', '-') + '.txt'
+        intern_name = contact_name(pair.intern_contact)
+        filename = intern_name.replace(',', '').replace(' ', '-') + '.txt'
+        path = os.path.join(args.outdir, filename)
+        if args.smtphost:
+            drafts.append(path)
+        if manifest.unchanged(path, content_hash(str(pair)), template):
+            unchanged += 1
+            continue
 
         coordinator_given_names = []
-        for c in pair.coordinator_contacts.split(','):
-            if c != '':
-                coordinator_given_names.append(c.split('<', 1)[0].strip().split(' ')[0])
-
-        this_body = body.replace('$INTERN', intern_name)
-        this_body = this_body.replace('$COMMUNITY', pair.community)
-        this_body = this_body.replace('$COORDINATOR', ' and '.join(coordinator_given_names))
-        with open(os.path.join(args.outdir, filename), 'w') as outfile:
+        for c in split_contacts(pair.coordinator_contacts):
+            coordinator_given_names.append(given_name(c))
+
+        this_body = body.render({
+            'INTERN': intern_name,
+            'COMMUNITY': pair.community,
+            'COORDINATOR': ' and '.join(coordinator_given_names),
+            })
+        with open(path, 'w') as outfile:
             outfile.write(header1)
 
             if pair.mentor_contacts != '':
@@ -129,10 +234,20 @@ def main():
                 outfile.write(pair.coordinator_contacts + '\n')
 
             if args.intern:
-                outfile.write('\t' + pair.intern_contacts + '\n')
+                outfile.write('\t' + pair.intern_contact + '\n')
             outfile.write('Bcc: organizers@outreachy.org\n')
             outfile.write(this_body)
             outfile.write(signature)
+        manifest.wrote(path, content_hash(str(pair)), template, pair.community)
+        written += 1
+    # With --community, drafts for other communities are left alone.
+    removed = manifest.save(args.community)
+    print('Wrote', written, 'draft emails to', args.outdir)
+    if unchanged:
+        print(unchanged, 'drafts were unchanged since the last run')
+    if removed:
+        print('Removed', removed, 'drafts for interns who are no longer in the contacts file')
+    send_drafts(args, drafts)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,239 @@
+#!/usr/bin/env python3
+#
+# Copyright 2020 Sage Sharp <sharp@otter.technology>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Send the draft emails written by the mailer scripts over SMTP.
+#
+# Drafts are sent over a small pool of persistent connections, limited to
+# a number of emails per minute. Emails that fail with a temporary error
+# are retried with exponential backoff. Requires aiosmtplib.
+#
+# Send drafts that were written earlier:
+# $ OUTREACHY_SMTP_PASSWORD=... ./emailsend.py --smtphost smtp.example.com --smtpuser me drafts/*.txt
+#
+# Or pass the same --smtp options to a mailer script to send the drafts it writes.
+#
+# To try it out, run a local SMTP server that prints every email:
+# $ python3 -m aiosmtpd -n -l localhost:8025
+# $ ./emailsend.py --smtphost localhost --smtpport 8025 --smtptls none drafts/*.txt
+
+import argparse
+import asyncio
+import email
+import email.errors
+import email.policy
+import getpass
+import json
+import os
+import time
+try:
+    import aiosmtplib
+except ImportError:
+    aiosmtplib = None
+
+def add_send_arguments(parser):
+    """Add the options for sending drafts to a mailer script's parser."""
+    parser.add_argument('--smtphost', help='Send the drafts through this SMTP server. Requires aiosmtplib.')
+    parser.add_argument('--smtpport', help='SMTP server port', type=int, default=587)
+    parser.add_argument('--smtpuser', help='SMTP user name. The password is read from $OUTREACHY_SMTP_PASSWORD, or asked for.')
+    parser.add_argument('--smtptls', help='How to encrypt the SMTP connection: starttls, tls, or none', choices=['starttls', 'tls', 'none'], default='starttls')
+    parser.add_argument('--smtpconnections', help='Number of SMTP connections to send over at once', type=int, default=4)
+    parser.add_argument('--smtprate', help='Maximum number of emails to send per minute', type=int, default=60)
+    parser.add_argument('--smtpretries', help='Number of times to retry an email after a temporary failure', type=int, default=3)
+
+def read_draft(path):
+    with open(path, 'rb') as draft:
+        return email.message_from_binary_file(draft, policy=email.policy.default)
+
+class rateLimiter:
+    """Space out sends so no more than rate happen in a minute."""
+    def __init__(self, rate):
+        self.interval = 60.0 / rate
+        self.next_send = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    async def wait(self):
+        async with self.lock:
+            now = time.monotonic()
+            if self.next_send > now:
+                await asyncio.sleep(self.next_send - now)
+            self.next_send = max(now, self.next_send) + self.interval
+
+class smtpSender:
+    """Sends drafts from a shared queue over one persistent SMTP connection."""
+    def __init__(self, args, password, queue, limiter, results, on_result):
+        self.args = args
+        self.password = password
+        self.queue = queue
+        self.limiter = limiter
+        self.results = results
+        self.on_result = on_result
+        self.smtp = None
+
+    async def connect(self):
+        self.smtp = aiosmtplib.SMTP(hostname=self.args.smtphost,
+                                    port=self.args.smtpport,
+                                    use_tls=self.args.smtptls == 'tls',
+                                    start_tls=True if self.args.smtptls == 'starttls' else False)
+        await self.smtp.connect()
+        if self.args.smtpuser:
+            await self.smtp.login(self.args.smtpuser, self.password)
+
+    async def disconnect(self):
+        if self.smtp is not None and self.smtp.is_connected:
+            try:
+                await self.smtp.quit()
+            except aiosmtplib.SMTPException:
+                self.smtp.close()
+        self.smtp = None
+
+    async def send(self, path):
+        try:
+            message = read_draft(path)
+        except (OSError, ValueError, email.errors.MessageError) as e:
+            return 'failed: could not read draft: ' + str(e)
+        for attempt in range(self.args.smtpretries + 1):
+            if attempt:
+                await asyncio.sleep(2 ** attempt)
+            try:
+                if self.smtp is None or not self.smtp.is_connected:
+                    await self.connect()
+                await self.limiter.wait()
+                await self.smtp.send_message(message)
+                return 'sent'
+            except aiosmtplib.SMTPRecipientsRefused as e:
+                # Every recipient was refused. Only try again if one of
+                # them might be accepted later.
+                error = '; '.join(str(refused) for refused in e.recipients)
+                if all(refused.code >= 500 for refused in e.recipients):
+                    return 'failed: ' + error
+            except aiosmtplib.SMTPResponseException as e:
+                # 5xx replies are permanent; don't try again.
+                if e.code >= 500:
+                    return 'failed: ' + str(e)
+                error = e
+            except ValueError as e:
+                # Drafts without a From or To address can't be sent at all.
+                return 'failed: ' + str(e)
+            except (aiosmtplib.SMTPException, OSError) as e:
+                error = e
+            await self.disconnect()
+        return 'failed: ' + str(error)
+
+    async def run(self):
+        try:
+            while True:
+                path = await self.queue.get()
+                try:
+                    # One bad draft mustn't stop this connection from
+                    # sending the rest, or leave the queue waiting on it.
+                    try:
+                        self.results[path] = await self.send(path)
+                    except asyncio.CancelledError:
+                        raise
+                    except Exception as e:
+                        self.results[path] = 'failed: ' + str(e)
+                    if self.on_result:
+                        try:
+                            self.on_result(path, self.results[path])
+                        except Exception as e:
+                            print('Could not record the result of sending', path + ':', e)
+                finally:
+                    self.queue.task_done()
+        finally:
+            await self.disconnect()
+
+async def send_all(args, password, paths, on_result):
+    queue = asyncio.Queue()
+    for path in paths:
+        queue.put_nowait(path)
+    limiter = rateLimiter(args.smtprate)
+    results = {}
+    senders = [asyncio.create_task(smtpSender(args, password, queue, limiter, results, on_result).run())
+               for i in range(min(args.smtpconnections, len(paths)))]
+    await queue.join()
+    for sender in senders:
+        sender.cancel()
+    await asyncio.gather(*senders, return_exceptions=True)
+    return results
+
+def send_drafts(args, paths, on_result=None):
+    """Send the draft email files in paths, if --smtphost was given.
+
+    on_result(path, result) is called as soon as each email is sent or fails.
+    Prints any emails that could not be sent, and returns a dict of
+    path -> 'sent' or 'failed: <reason>'."""
+    if not args.smtphost or not paths:
+        return {}
+    if aiosmtplib is None:
+        print('Sending email requires aiosmtplib; the drafts were not sent.')
+        return {}
+    password = None
+    if args.smtpuser:
+        password = os.environ.get('OUTREACHY_SMTP_PASSWORD') or getpass.getpass('SMTP password for ' + args.smtpuser + ': ')
+    results = asyncio.run(send_all(args, password, paths, on_result))
+    sent = [path for path, result in results.items() if result == 'sent']
+    print('Sent', len(sent), 'of', len(paths), 'emails through', args.smtphost)
+    for path in paths:
+        results.setdefault(path, 'failed: not sent')
+        if results[path] != 'sent':
+            print('Could not send', path, results[path])
+    return results
+
+class mailJournal:
+    """Append-only record of the drafts written and sent to each recipient.
+
+    Each line is a JSON object with the stage (e.g. which reminder), the
+    recipient, the hash of the rendered email, and its state: 'written',
+    'sent', or 'failed'. The last line for a stage and recipient wins.
+    Lines are flushed as they are recorded, so an interrupted run loses at
+    most the email that was being sent."""
+    def __init__(self, path):
+        self.latest = {}
+        if os.path.exists(path):
+            with open(path, 'r') as journalFile:
+                for line in journalFile:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        # A line cut short by an interrupted run
+                        continue
+                    self.latest[(entry['stage'], entry['recipient'])] = entry
+        self.journalFile = open(path, 'a')
+
+    def get(self, stage, recipient):
+        return self.latest.get((stage, recipient))
+
+    def record(self, stage, recipient, digest, state):
+        entry = {'stage': stage, 'recipient': recipient, 'hash': digest, 'state': state}
+        self.journalFile.write(json.dumps(entry) + '\n')
+        self.journalFile.flush()
+        self.latest[(stage, recipient)] = entry
+
+    def close(self):
+        self.journalFile.close()
+
+def main():
+    parser = argparse.ArgumentParser(description='Send draft emails written by the Outreachy mailer scripts')
+    parser.add_argument('drafts', nargs='+', help='draft email files to send')
+    add_send_arguments(parser)
+    args = parser.parse_args()
+    if not args.smtphost:
+        parser.error('--smtphost is required')
+    send_drafts(args, args.drafts)
+
+if __name__ == "__main__":
+    main()
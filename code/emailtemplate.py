@@ -0,0 +1,135 @@
+# Copyright 2020 Sage Sharp <sharp@otter.technology>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Email templates for the mailer scripts.
+#
+# Placeholders are written {{NAME}}, so they can't be confused with
+# ordinary words in the email. A template is split into literal text
+# and placeholders once, and each email is rendered with a single join:
+#
+#   template = emailTemplate('Hi {{NAME}},\n...')
+#   text = template.render({'NAME': 'Sage'})
+#
+# A draftManifest remembers which inputs each draft in a directory was
+# rendered from, so a rerun only rewrites the drafts whose inputs changed,
+# and removes drafts for people who are no longer on the list.
+
+import hashlib
+import json
+import os
+import re
+from longitudinalsurveyschema import normalize_email
+
+placeholder = r'\{\{(\w+)\}\}'
+
+def word_placeholders(names, prefix=''):
+    """Placeholder pattern for older templates that use bare words like NAME
+    or $INTERN as placeholders. Only the listed names are placeholders."""
+    names = sorted(names, key=len, reverse=True)
+    return re.escape(prefix) + r'\b(' + '|'.join(re.escape(name) for name in names) + r')\b'
+
+class emailTemplate:
+    """A template split into literal text and placeholder slots."""
+    def __init__(self, text, pattern=placeholder):
+        pieces = re.split(pattern, text)
+        # re.split puts the placeholder names at the odd indexes.
+        self.parts = pieces
+        self.slots = [(index, pieces[index]) for index in range(1, len(pieces), 2)]
+        self.names = set(name for index, name in self.slots)
+
+    def render(self, values):
+        parts = list(self.parts)
+        for index, name in self.slots:
+            parts[index] = values[name]
+        return ''.join(parts)
+
+    def missing(self, values):
+        """Placeholders in the template that values has no entry for."""
+        return sorted(name for name in self.names if name not in values)
+
+def content_hash(*parts):
+    """Hash of a sequence of strings, e.g. the templates an email uses,
+    or the fields of a CSV row."""
+    return hashlib.sha1('\x1f'.join(parts).encode('utf-8')).hexdigest()
+
+def draft_filename(address, prefix=''):
+    """Name of the draft for the recipient at address. Drafts are named by
+    the normalized address, not by CSV row, so adding or removing a row
+    doesn't rename the drafts of everyone after it."""
+    return prefix + re.sub(r'[^\w.@+-]', '_', normalize_email(address)) + '.txt'
+
+class draftManifest:
+    """The (input row hash, template hash) each draft in outdir was written
+    from, and optionally the hash of the draft itself.
+
+    Stored as .manifest.json in outdir. Entries can be tagged with a group
+    (e.g. a community), so a run that only regenerates one group leaves
+    the other groups' drafts alone."""
+    def __init__(self, outdir):
+        self.outdir = outdir
+        self.path = os.path.join(outdir, '.manifest.json')
+        self.previous = {}
+        if os.path.exists(self.path):
+            with open(self.path, 'r') as manifestFile:
+                self.previous = json.load(manifestFile)
+        self.drafts = {}
+
+    def unchanged(self, path, row_hash, template_hash):
+        """Whether the draft at path was already written from these inputs.
+        If so, it's kept in the manifest."""
+        name = os.path.relpath(path, self.outdir)
+        entry = self.previous.get(name)
+        if (entry is None or entry['row'] != row_hash or entry['template'] != template_hash
+                or not os.path.exists(path)):
+            return False
+        self.drafts[name] = entry
+        return True
+
+    def wrote(self, path, row_hash, template_hash, group=None, digest=None):
+        name = os.path.relpath(path, self.outdir)
+        self.drafts[name] = {'row': row_hash, 'template': template_hash, 'group': group}
+        if digest is not None:
+            self.drafts[name]['hash'] = digest
+
+    def get(self, path):
+        """The manifest entry of a draft that was written or kept this run."""
+        return self.drafts.get(os.path.relpath(path, self.outdir))
+
+    def keep(self, path):
+        """Keep a draft that wasn't regenerated this run, e.g. one that was already sent."""
+        name = os.path.relpath(path, self.outdir)
+        if name in self.previous:
+            self.drafts[name] = self.previous[name]
+
+    def save(self, group=None):
+        """Remove the drafts from the last run that weren't written or kept
+        this run, and save the manifest. If group is set, only drafts in
+        that group are removed. Returns the number of drafts removed."""
+        removed = 0
+        for name, entry in self.previous.items():
+            if name in self.drafts:
+                continue
+            if group is not None and entry['group'] != group:
+                self.drafts[name] = entry
+                continue
+            path = os.path.join(self.outdir, name)
+            if os.path.exists(path):
+                os.remove(path)
+                removed += 1
+        tmppath = self.path + '.tmp'
+        with open(tmppath, 'w') as manifestFile:
+            json.dump(self.drafts, manifestFile, sort_keys=True)
+        os.replace(tmppath, self.path)
+        return removed
@@ -21,11 +21,15 @@ import argparse
 import csv
 import os
 from resumesearch import header1, header3, atBooth, generalInfo, moreInfo
+from emailsend import add_send_arguments, send_drafts
+from outreachcontacts import add_contacts_arguments, open_contacts
 
 def main():
     parser = argparse.ArgumentParser(description='Search text resume files for skillset matches.')
     parser.add_argument('outdir', help='Directory to create form emails in')
     parser.add_argument('csv', help='CSV file of people who stopped by the booth')
+    add_send_arguments(parser)
+    add_contacts_arguments(parser)
     args = parser.parse_args()
 
     if not os.path.exists(args.outdir):
@@ -38,13 +42,30 @@ def main():
             if not row['Tapia resume database?']:
                 tosend.append('"' + row['Name'] + '" <' + row['Email'] + '>')
 
+    store = open_contacts(args)
+    if store:
+        store.add(tosend, 'tapia booth')
+
+    drafts = []
+    skipped = 0
     for index, contact in enumerate(tosend):
-        with open(os.path.join(args.outdir, str(index) + '.txt'), 'w') as email:
+        if store and store.emailed(contact):
+            skipped += 1
+            continue
+        drafts.append(os.path.join(args.outdir, str(index) + '.txt'))
+        with open(drafts[-1], 'w') as email:
             email.write(header1)
             email.write('To: ' + contact + '\n')
             email.write(header3)
             email.write(atBooth + generalInfo + moreInfo)
-    print('Wrote', len(tosend), 'resume draft emails to', args.outdir)
+        if store:
+            store.written(contact, drafts[-1])
+    print('Wrote', len(drafts), 'resume draft emails to', args.outdir)
+    if skipped:
+        print('Skipped', skipped, 'people who were already emailed this round')
+    send_drafts(args, drafts, store.on_result if store else None)
+    if store:
+        store.close()
 
 if __name__ == "__main__":
     main()
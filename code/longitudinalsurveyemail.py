@@ -21,6 +21,14 @@ import argparse
 import csv
 import os
 import datetime
+import hashlib
+import json
+import math
+from concurrent.futures import ProcessPoolExecutor
+from emailsend import add_send_arguments, send_drafts, mailJournal
+from outreachcontacts import add_contacts_arguments, open_contacts
+from longitudinalsurveyschema import normalize_email
+from emailtemplate import emailTemplate, content_hash, draftManifest, draft_filename
 
 header1 = '''From: Outreachy Organizers <organizers@outreachy.org>
 '''
@@ -30,9 +38,9 @@ header3 = '''Subject: Outreachy needs your help!
 reminder_subject = '''Subject: Please fill out the Outreachy longitudinal survey
 
 '''
-reminder_body = '''Please take 20 minutes to fill out the longitudinal survey for past PROGRAM interns:
+reminder_body = '''Please take 20 minutes to fill out the longitudinal survey for past {{PROGRAM}} interns:
 
-URL
+{{URL}}
 
 We really appreciate your help! See the email below for more details on the survey.
 
@@ -43,9 +51,9 @@ We really appreciate your help! See the email below for more details on the surv
 final_reminder_subject = '''Subject: Last chance for an Outreachy sticker!
 
 '''
-final_reminder_body = '''Please take 20 minutes to fill out the longitudinal survey for past PROGRAM interns. If you fill it out by EOD on DUEDATE, we'll send you an Outreachy sticker:
+final_reminder_body = '''Please take 20 minutes to fill out the longitudinal survey for past {{PROGRAM}} interns. If you fill it out by EOD on {{DUEDATE}}, we'll send you an Outreachy sticker:
 
-URL
+{{URL}}
 
 We really appreciate your help! See the email below for more details on the survey.
 
@@ -53,13 +61,13 @@ We really appreciate your help! See the email below for more details on the surv
 
 '''
 
-body = '''Hi NAME,
+body = '''Hi {{NAME}},
 
-According to our records, you participated in the PROGRAM internships with COMMUNITY from START to END. Now we need your help!
+According to our records, you participated in the {{PROGRAM}} internships with {{COMMUNITY}} from {{START}} to {{END}}. Now we need your help!
 
-Outreachy is conducting our first longitudinal survey. If you fill out the survey, we'll mail you a thank you card and an Outreachy sticker. The survey should take about 20 minutes to complete. Please complete the survey by DUEDATE:
+Outreachy is conducting our first longitudinal survey. If you fill out the survey, we'll mail you a thank you card and an Outreachy sticker. The survey should take about 20 minutes to complete. Please complete the survey by {{DUEDATE}}:
 
-URL
+{{URL}}
 
 
 Why run a longitudinal survey?
@@ -69,7 +77,7 @@ The TLDR is the survey data and comments will be very helpful to understand how
 
 Outreachy has been running for over 10 years! Our internship program started in 2006 as the GNOME Women's Summer Outreach Program. In 2010, the program was restarted under the name the GNOME Outreach Program for Women. In 2013, more free software communities joined as mentoring organizations, and the name changed again to the Outreach Program for Women (OPW). In 2015, we began inviting more marginalized groups to apply for our internships, and we changed our name to Outreachy.
 
-TOTAL people have been interns! 🤯
+{{TOTAL}} people have been interns! 🤯
 
 We often get asked by sponsors about what happens to Outreachy alums after they finish their internship. We're conducting a longitudinal survey to gather data about who are alums are, and what they're currently doing. We also hope to gather some quotes about the impact the internship had on you.
 
@@ -91,7 +99,7 @@ Survey Rewards
 
 At the end of the longitudinal survey, we'll ask for your mailing address. We'll use that to send you a thank you card with an Outreachy sticker!
 
-Please fill out the survey by DUEDATE in order to receive your sticker. We'll be having volunteers stuff envelopes in Portland, OR, USA on STUFFINGDATE to ENDSTUFFINGTIME. If you want to help out, let us know by replying to this email.
+Please fill out the survey by {{DUEDATE}} in order to receive your sticker. We'll be having volunteers stuff envelopes in Portland, OR, USA on {{STUFFINGDATE}} to {{ENDSTUFFINGTIME}}. If you want to help out, let us know by replying to this email.
 
 If you don't want a thank you card or sticker, then leave the address field at the end of the survey blank.
 
@@ -108,11 +116,73 @@ Outreachy now has a private chat server and an opportunities mailing list. Alums
 
 We hope you'll fill out the Outreachy longitudinal survey:
 
-URL
+{{URL}}
 
 Outreachy Organizers
 '''
 
+reminder_template = emailTemplate(reminder_body)
+final_reminder_template = emailTemplate(final_reminder_body)
+body_template = emailTemplate(body)
+
+def templates_hash(values, reminder):
+    """Hash of everything that's the same in each email of this --reminder stage."""
+    return content_hash(header1, header3, reminder_subject, reminder_body,
+                        final_reminder_subject, final_reminder_body, body,
+                        json.dumps(values, sort_keys=True), str(reminder))
+
+def row_hash(row):
+    return content_hash(json.dumps(row, sort_keys=True))
+
+def draft_path(outdir, row):
+    return os.path.join(outdir, draft_filename(row['Email']))
+
+def contact(row):
+    return '"' + row['Public Name'] + '" <' + row['Email'] + '>'
+
+def render_email(row, values, reminder):
+    values = dict(values)
+    values['PROGRAM'] = row['Program Name']
+    values['COMMUNITY'] = row['Community']
+    values['START'] = row['Round Start Date']
+    values['END'] = row['Round End Date']
+    values['NAME'] = row['Public Name'].split(' ')[0]
+    parts = [header1, 'To: ' + contact(row) + '\n']
+    if reminder == 1:
+        parts.append(reminder_subject)
+        parts.append(reminder_template.render(values))
+    elif reminder == 2:
+        parts.append(final_reminder_subject)
+        parts.append(final_reminder_template.render(values))
+    else:
+        parts.append(header3)
+    parts.append(body_template.render(values))
+    return ''.join(parts)
+
+def write_emails(outdir, rows, values, reminder):
+    """Render the emails for a list of (CSV row number, row, previous hash),
+    then write out the ones that changed.
+
+    A draft is only rewritten if the hash of the rendered email differs from
+    the previous hash, or the draft file doesn't hold that email (e.g. it
+    was overwritten by a different --reminder stage).
+    Returns a list of (CSV row number, hash, whether the draft was written)."""
+    emails = []
+    for index, row, previous in rows:
+        text = render_email(row, values, reminder)
+        emails.append((index, draft_path(outdir, row), text, hashlib.sha1(text.encode('utf-8')).hexdigest(), previous))
+    results = []
+    for index, path, text, digest, previous in emails:
+        if digest == previous and os.path.exists(path):
+            with open(path, 'r') as email:
+                if email.read() == text:
+                    results.append((index, digest, False))
+                    continue
+        with open(path, 'w') as email:
+            email.write(text)
+        results.append((index, digest, True))
+    return results
+
 def main():
     parser = argparse.ArgumentParser(description='Send an email to Outreachy alums to ask them to participate in the longitudinal survey')
     parser.add_argument('--outdir', help='Directory to create form emails in')
@@ -124,6 +194,10 @@ def main():
     parser.add_argument('--totalinterns', help='Manually set the total number of interns. Required for reminder emails. Set to 0 to use the number of recipients in the CSV file', type=int)
     parser.add_argument('--reminder', help='Set to 0 if sending the first email, 1 for a mid-point reminder, and 2 for a final reminder', type=int, default=0)
     parser.add_argument('--surveyheader', help='CSV header for whether a participant responded to the survey')
+    parser.add_argument('--jobs', help='Number of worker processes to render the emails with', type=int, default=1)
+    parser.add_argument('--journal', help='File to record the drafts written and emails sent in. When rerun with the same journal and --reminder, alums who were already sent this email are skipped, and only drafts that changed are rewritten.')
+    add_send_arguments(parser)
+    add_contacts_arguments(parser)
     args = parser.parse_args()
 
     if not os.path.exists(args.outdir):
@@ -140,43 +214,118 @@ def main():
     else:
         total_interns = args.totalinterns
 
-    written_emails = 0
+    # Values that are the same in every email
+    values = {
+        'DUEDATE': args.duedate.strftime('%B %d'),
+        'STUFFINGDATE': args.stuffingdate.strftime('%B %d from %H:%M'),
+        'ENDSTUFFINGTIME': args.endstuffingdate.strftime('%H:%M'),
+        'URL': args.survey,
+        'TOTAL': str(total_interns),
+    }
+
+    journal = None
+    stage = 'reminder ' + str(args.reminder)
+    if args.journal:
+        journal = mailJournal(args.journal)
+
+    store = open_contacts(args, stage)
+    if store:
+        store.add((contact(row) for row in data if row['Correct email address?'] != 'No'), 'alums')
+
+    # Drafts for alums whose row and the templates haven't changed since
+    # the last run into this --outdir aren't rendered again.
+    manifest = draftManifest(args.outdir)
+    template = templates_hash(values, args.reminder)
+
+    torender = []
+    recipients = {}
+    already_sent = 0
+    emailed = 0
+    duplicates = 0
+    unchanged = []
+    paths = {}
+    drafted = set()
     for index, row in enumerate(data):
         if row['Correct email address?'] == 'No':
             continue
         if args.reminder and args.surveyheader and row[args.surveyheader] == 'Yes':
             continue
+        # Alums who interned more than once get one email, for their first row.
+        path = draft_path(args.outdir, row)
+        if path in drafted:
+            duplicates += 1
+            continue
+        drafted.add(path)
+        paths[index] = path
+        if store and store.emailed(contact(row)):
+            emailed += 1
+            continue
+        previous = None
+        if journal:
+            recipients[index] = normalize_email(row['Email'])
+            entry = journal.get(stage, recipients[index])
+            if entry and entry['state'] == 'sent':
+                already_sent += 1
+                manifest.keep(path)
+                continue
+            if entry:
+                previous = entry['hash']
+        if manifest.unchanged(path, row_hash(row), template) and 'hash' in manifest.get(path):
+            unchanged.append((index, manifest.get(path)['hash'], False))
+            continue
+        torender.append((index, row, previous))
+
+    if args.jobs > 1:
+        # A few chunks per worker, so one slow chunk doesn't hold up the rest.
+        chunk_size = max(1, math.ceil(len(torender) / (args.jobs * 4)))
+        chunks = [torender[i:i + chunk_size] for i in range(0, len(torender), chunk_size)]
+        with ProcessPoolExecutor(max_workers=args.jobs) as executor:
+            futures = [executor.submit(write_emails, args.outdir, chunk, values, args.reminder) for chunk in chunks]
+            results = [result for future in futures for result in future.result()]
+    else:
+        results = write_emails(args.outdir, torender, values, args.reminder)
+    for index, digest, written in results:
+        manifest.wrote(paths[index], row_hash(data[index]), template, digest=digest)
+    removed = manifest.save()
+    results = unchanged + results
 
-        with open(os.path.join(args.outdir, str(index) + '.txt'), 'w') as email:
-            email.write(header1)
-            email.write('To: "' + row['Public Name'] + '" <' + row['Email'] + '>\n')
-            if args.reminder == 1:
-                email.write(reminder_subject)
-                this_reminder_body = reminder_body.replace('PROGRAM', row['Program Name'])
-                this_reminder_body = this_reminder_body.replace('URL', args.survey)
-                email.write(this_reminder_body)
-            elif args.reminder == 2:
-                email.write(final_reminder_subject)
-                this_reminder_body = final_reminder_body.replace('PROGRAM', row['Program Name'])
-                this_reminder_body = this_reminder_body.replace('DUEDATE', args.duedate.strftime('%B %d'))
-                this_reminder_body = this_reminder_body.replace('URL', args.survey)
-                email.write(this_reminder_body)
-            else:
-                email.write(header3)
-            thisbody = body.replace('DUEDATE', args.duedate.strftime('%B %d'))
-            thisbody = thisbody.replace('STUFFINGDATE', args.stuffingdate.strftime('%B %d from %H:%M'))
-            thisbody = thisbody.replace('ENDSTUFFINGTIME', args.endstuffingdate.strftime('%H:%M'))
-            thisbody = thisbody.replace('URL', args.survey)
-            thisbody = thisbody.replace('TOTAL', str(total_interns))
-            thisbody = thisbody.replace('PROGRAM', row['Program Name'])
-            thisbody = thisbody.replace('COMMUNITY', row['Community'])
-            thisbody = thisbody.replace('START', row['Round Start Date'])
-            thisbody = thisbody.replace('END', row['Round End Date'])
-            thisbody = thisbody.replace('NAME', row['Public Name'].split(' ')[0])
-            email.write(thisbody)
-            written_emails += 1
-
+    written_emails = len([written for index, digest, written in results if written])
     print('Wrote', written_emails, 'draft emails to', args.outdir)
+    if removed:
+        print('Removed', removed, 'drafts for alums who no longer need this email')
+    if unchanged and not journal:
+        print(len(unchanged), 'drafts were unchanged since the last run')
+    if emailed:
+        print('Skipped', emailed, 'alums who were already emailed this round')
+    if duplicates:
+        print('Skipped', duplicates, 'rows with the same email address as an earlier row')
+
+    drafts = dict((paths[index], (index, digest)) for index, digest, written in results)
+    if store:
+        for path, (index, digest) in drafts.items():
+            store.written(contact(data[index]), path)
+    on_result = None
+    if journal:
+        print(len(results) - written_emails, 'drafts were unchanged since the last run, and',
+              already_sent, 'alums were already sent this email')
+        for index, digest, written in results:
+            # Drafts kept from the last run get an entry too, in case the
+            # journal is new or was last written for a different draft.
+            entry = journal.get(stage, recipients[index])
+            if written or not entry or entry['hash'] != digest or entry['state'] != 'written':
+                journal.record(stage, recipients[index], digest, 'written')
+        def on_result(path, result):
+            index, digest = drafts[path]
+            journal.record(stage, recipients[index], digest, 'sent' if result == 'sent' else 'failed')
+            if store:
+                store.on_result(path, result)
+    elif store:
+        on_result = store.on_result
+    send_drafts(args, list(drafts), on_result)
+    if journal:
+        journal.close()
+    if store:
+        store.close()
 
 if __name__ == "__main__":
     main()
@@ -21,46 +21,246 @@ import argparse
 import csv
 import os
 import datetime
-from tempfile import NamedTemporaryFile
+import heapq
+import itertools
+import json
+from tempfile import NamedTemporaryFile, TemporaryDirectory
 import shutil
+from operator import itemgetter
+from longitudinalsurveyschema import read_survey, stream_survey, normalize_email, normalize_name
 
-def main():
-    parser = argparse.ArgumentParser(description='Parse a CSV file of longitudinal survey responses and update the participant CSV with which participants responded')
-    parser.add_argument('--participantcsv', help='CSV file of alum info')
-    parser.add_argument('--surveycsv', help='CSV file of longitudinal survey results')
-    args = parser.parse_args()
+survey_columns = ['first_name', 'last_name', 'email', 'round', 'community']
+responded_header = 'Responded to 2019-10 survey?'
+
+def participant_name_key(participant):
+    return [normalize_name(participant['Public Name']), participant['Community'].strip().lower()]
 
-    tempfile = NamedTemporaryFile(mode='w', delete=False, newline='')
+def response_name_key(schema, response):
+    return [normalize_name(schema.first_name(response) + ' ' + schema.last_name(response)),
+            schema.community(response).strip().lower()]
 
+def print_response(schema, response):
+    print(schema.first_name(response), schema.last_name(response), schema.email(response), schema.round(response), schema.community(response))
+
+def match_in_memory(participantcsv, surveycsv):
+    """Find the participants who responded to the survey.
+
+    Returns the sorted row numbers of those participants in the participant CSV."""
     participant_data = []
-    with open(args.participantcsv, 'r') as csvFile:
+    with open(participantcsv, 'r') as csvFile:
         freader = csv.DictReader(csvFile, delimiter=',', quotechar='"')
         for row in freader:
             participant_data.append(row)
-    fieldnames = freader.fieldnames
 
-    survey_data = []
-    with open(args.surveycsv, 'r') as csvFile:
-        freader = csv.DictReader(csvFile, delimiter=';', quotechar='"')
-        for row in freader:
-            survey_data.append(row)
+    schema, survey_data = read_survey(surveycsv, survey_columns)
+
+    # Index the participants by email once, instead of comparing every
+    # response to every participant. Alums who answered from a different
+    # address are matched by name and community instead. The participant
+    # CSV doesn't have a round column, so an alum who interned with the
+    # same community twice can't be matched by name.
+    by_email = {}
+    by_name = {}
+    for index, participant in enumerate(participant_data):
+        by_email.setdefault(normalize_email(participant['Email']), index)
+        key = participant_name_key(participant)
+        if key[0]:
+            by_name.setdefault(tuple(key), []).append(index)
 
+    responded = set()
+    matched_by_email = 0
+    matched_by_name = []
+    unmatched = []
     for response in survey_data:
-        found = False
-        for participant in participant_data:
-            if response['Email address'].lower() == participant['Email'].lower():
-                participant['Responded to 2019-10 survey?'] = 'Yes'
-                found = True
-                break
-        if not found:
-            print(response['First Name / Given Name'], response['Last Name / Family Name'], response['Email address'], response['Which Outreachy round did you participate in?'], response['Which community did you intern with?'])
-
-    fwriter = csv.DictWriter(tempfile, delimiter=',', quotechar='"', fieldnames=fieldnames)
-    fwriter.writeheader()
-    for row in participant_data:
-        fwriter.writerow(row)
-
-    print('cat ', tempfile.name)
+        index = by_email.get(normalize_email(schema.email(response)))
+        if index is None:
+            candidates = by_name.get(tuple(response_name_key(schema, response)), [])
+            if len(candidates) == 1:
+                index = candidates[0]
+                matched_by_name.append((response, participant_data[index]))
+        else:
+            matched_by_email += 1
+        if index is None:
+            unmatched.append(response)
+            continue
+        responded.add(index)
+
+    print('Responses matched by email:', matched_by_email)
+    print('Responses matched by name and community:', len(matched_by_name))
+    for response, participant in matched_by_name:
+        print(' ', schema.email(response), 'matched', participant['Public Name'], participant['Email'])
+    print('Responses that did not match any participant:', len(unmatched))
+    for response in unmatched:
+        print_response(schema, response)
+    return sorted(responded)
+
+class externalSorter:
+    """Sort records that may not fit in memory.
+
+    Records are lists of JSON values, sorted by comparing the lists.
+    At most chunk_rows records are held in memory; full chunks are sorted
+    and spilled to files in spilldir, then merged when read back. At most
+    fan_in files are open at once: if there are more, they're merged into
+    bigger files in passes first."""
+    def __init__(self, spilldir, chunk_rows, fan_in=16):
+        self.spilldir = spilldir
+        self.chunk_rows = chunk_rows
+        self.fan_in = fan_in
+        self.chunk = []
+        self.chunk_files = []
+
+    def add(self, record):
+        self.chunk.append(record)
+        if len(self.chunk) >= self.chunk_rows:
+            self.spill()
+
+    def write_chunk(self, records):
+        with NamedTemporaryFile(mode='w', dir=self.spilldir, delete=False) as chunkFile:
+            for record in records:
+                chunkFile.write(json.dumps(record) + '\n')
+        return chunkFile.name
+
+    def spill(self):
+        self.chunk.sort()
+        self.chunk_files.append(self.write_chunk(self.chunk))
+        self.chunk = []
+
+    def read_chunk(self, path):
+        with open(path, 'r') as chunkFile:
+            for line in chunkFile:
+                yield json.loads(line)
+
+    def sorted(self):
+        if self.chunk:
+            self.spill()
+        while len(self.chunk_files) > self.fan_in:
+            merging = self.chunk_files[:self.fan_in]
+            merged = self.write_chunk(heapq.merge(*[self.read_chunk(path) for path in merging]))
+            for path in merging:
+                os.remove(path)
+            self.chunk_files = self.chunk_files[self.fan_in:] + [merged]
+        return heapq.merge(*[self.read_chunk(path) for path in self.chunk_files])
+
+def merge_join(left, right):
+    """Walk two streams of records sorted on their first item.
+
+    Yields (key, left records, right records) for every key in either stream."""
+    left = itertools.groupby(left, key=itemgetter(0))
+    right = itertools.groupby(right, key=itemgetter(0))
+    l = next(left, None)
+    r = next(right, None)
+    while l is not None or r is not None:
+        if r is None or (l is not None and l[0] < r[0]):
+            yield l[0], list(l[1]), []
+            l = next(left, None)
+        elif l is None or r[0] < l[0]:
+            yield r[0], [], list(r[1])
+            r = next(right, None)
+        else:
+            yield l[0], list(l[1]), list(r[1])
+            l = next(left, None)
+            r = next(right, None)
+
+def match_bounded(participantcsv, surveycsv, chunk_rows, spilldir):
+    """Find the participants who responded to the survey, holding at most
+    chunk_rows rows of either CSV in memory at once.
+
+    Both CSVs are sorted on disk by normalized email and merge-joined.
+    Responses that don't match are sorted by name and community and
+    merge-joined with the participants again. The responses matched by
+    name and the unmatched responses are sorted back into survey order
+    before they're printed, so the output is the same as match_in_memory.
+    Returns an iterator of the sorted row numbers of matched participants."""
+    participants_by_email = externalSorter(spilldir, chunk_rows)
+    participants_by_name = externalSorter(spilldir, chunk_rows)
+    with open(participantcsv, 'r') as csvFile:
+        freader = csv.DictReader(csvFile, delimiter=',', quotechar='"')
+        for index, row in enumerate(freader):
+            participants_by_email.add([normalize_email(row['Email']), index])
+            key = participant_name_key(row)
+            if key[0]:
+                participants_by_name.add([key, index, row['Public Name'], row['Email']])
+
+    schema, survey_data = stream_survey(surveycsv, survey_columns)
+    responses_by_email = externalSorter(spilldir, chunk_rows)
+    for position, response in enumerate(survey_data):
+        responses_by_email.add([normalize_email(schema.email(response)), position, list(response)])
+
+    responded = externalSorter(spilldir, chunk_rows)
+    responses_by_name = externalSorter(spilldir, chunk_rows)
+    matched_by_email = 0
+    for email, participants, responses in merge_join(participants_by_email.sorted(), responses_by_email.sorted()):
+        if participants and responses:
+            responded.add([participants[0][1]])
+            matched_by_email += len(responses)
+        else:
+            for email, position, response in responses:
+                responses_by_name.add([response_name_key(schema, response), position, response])
+
+    matched_by_name = externalSorter(spilldir, chunk_rows)
+    unmatched = externalSorter(spilldir, chunk_rows)
+    matched_by_name_count = 0
+    unmatched_count = 0
+    for key, participants, responses in merge_join(participants_by_name.sorted(), responses_by_name.sorted()):
+        for key, position, response in responses:
+            if len(participants) == 1:
+                key, index, name, email = participants[0]
+                matched_by_name.add([position, schema.email(response), name, email])
+                matched_by_name_count += 1
+                responded.add([index])
+            else:
+                unmatched.add([position, response])
+                unmatched_count += 1
+
+    print('Responses matched by email:', matched_by_email)
+    print('Responses matched by name and community:', matched_by_name_count)
+    for position, response_email, name, email in matched_by_name.sorted():
+        print(' ', response_email, 'matched', name, email)
+    print('Responses that did not match any participant:', unmatched_count)
+    for position, response in unmatched.sorted():
+        print_response(schema, response)
+    return (record[0] for record in responded.sorted())
+
+def write_participants(participantcsv, responded):
+    """Mark the participants at the sorted row numbers in responded as having
+    responded, and replace the participant CSV with the updated copy."""
+    responded = iter(responded)
+    next_responded = next(responded, None)
+    # Write the copy next to the original, so it can be renamed over it.
+    tempfile = NamedTemporaryFile(mode='w', delete=False, newline='',
+                                  dir=os.path.dirname(os.path.abspath(participantcsv)),
+                                  prefix='.' + os.path.basename(participantcsv))
+    with open(participantcsv, 'r') as csvFile, tempfile:
+        freader = csv.DictReader(csvFile, delimiter=',', quotechar='"')
+        fieldnames = freader.fieldnames
+        if responded_header not in fieldnames:
+            fieldnames = fieldnames + [responded_header]
+        fwriter = csv.DictWriter(tempfile, delimiter=',', quotechar='"', fieldnames=fieldnames)
+        fwriter.writeheader()
+        for index, row in enumerate(freader):
+            while next_responded is not None and next_responded < index:
+                next_responded = next(responded, None)
+            if next_responded == index:
+                row[responded_header] = 'Yes'
+            fwriter.writerow(row)
+    shutil.copymode(participantcsv, tempfile.name)
+    os.replace(tempfile.name, participantcsv)
+
+def main():
+    parser = argparse.ArgumentParser(description='Parse a CSV file of longitudinal survey responses and update the participant CSV with which participants responded')
+    parser.add_argument('--participantcsv', help='CSV file of alum info. It is updated in place.')
+    parser.add_argument('--surveycsv', help='CSV file of longitudinal survey results')
+    parser.add_argument('--chunkrows', help='Sort both CSV files on disk in chunks of this many rows, instead of loading them into memory', type=int, default=0)
+    args = parser.parse_args()
+
+    if args.chunkrows:
+        with TemporaryDirectory() as spilldir:
+            responded = match_bounded(args.participantcsv, args.surveycsv, args.chunkrows, spilldir)
+            write_participants(args.participantcsv, responded)
+    else:
+        responded = match_in_memory(args.participantcsv, args.surveycsv)
+        write_participants(args.participantcsv, responded)
+    print('Updated', args.participantcsv)
 
 if __name__ == "__main__":
     main()
@@ -18,88 +18,100 @@
 # Create a set of generic form emails when we don't have a resume match.
 
 import argparse
-import csv
+import datetime
+import hashlib
+import json
+import os
+import sys
+from collections import Counter
+from longitudinalsurveyschema import read_survey, normalize_email, normalize_name
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+class bootstrapCount(int):
+    """A count, plus the same count in every bootstrap resample of the survey."""
+    def __new__(cls, value, resamples, confidence):
+        count = int.__new__(cls, value)
+        count.resamples = resamples
+        count.confidence = confidence
+        return count
 
 def print_percentage(name, partial, total):
-    print('{}: {:.0f}% ({})'.format(name, float(partial / total * 100), partial))
-
-def race_and_ethnicity_demographics(data):
+    line = '{}: {:.0f}% ({})'.format(name, float(partial / total * 100), partial)
+    if hasattr(total, 'resamples'):
+        # Resamples where nobody is in the group (e.g. no students) have no percentage.
+        with numpy.errstate(divide='ignore', invalid='ignore'):
+            ratios = getattr(partial, 'resamples', 0) / total.resamples
+        tail = (100 - total.confidence) / 2
+        low, high = numpy.nanpercentile(ratios, [tail, 100 - tail]) * 100
+        line = line + ' [{:g}% CI {:.0f}-{:.0f}%]'.format(total.confidence, low, high)
+    print(line)
+
+def count_race_and_ethnicity(data, counts, schema):
     # demographics:
     # 'What is your race and ethnicity? (Select all that apply)/Asian'
-    total_alums = 0
-    asian_alums = 0
-    black_alums = 0
-    hispanic_or_latinx_alums = 0
-    indigenous_alums = 0
-    middle_eastern_alums = 0
-    white_alums = 0
-    disadvantaged_caste = 0
-    disadvantaged_tribe = 0
     for index, row in enumerate(data):
-        total_alums += 1
-        if row['What is your race and ethnicity? (Select all that apply)/Asian'] == '1':
-            asian_alums += 1
-        if row['What is your race and ethnicity? (Select all that apply)/Black'] == '1':
-            black_alums += 1
-        if row['What is your race and ethnicity? (Select all that apply)/Hispanic or Latinx'] == '1':
-            hispanic_or_latinx_alums += 1
-        if row['What is your race and ethnicity? (Select all that apply)/Indigenous'] == '1':
-            indigenous_alums += 1
-        if row['What is your race and ethnicity? (Select all that apply)/Middle Eastern'] == '1':
-            middle_eastern_alums += 1
-        if row['What is your race and ethnicity? (Select all that apply)/White'] == '1':
-            white_alums += 1
-        if row['Are you a member of a historically disadvantaged caste / scheduled caste?'] == 'Yes':
-            disadvantaged_caste += 1
-        if row['Are you a member of a historically disadvantaged tribe?'] == 'Yes':
-            disadvantaged_tribe += 1
-
-    print('Total alums: {}'.format(total_alums))
-    print_percentage('Asian', asian_alums, total_alums)
-    print_percentage('Black', black_alums, total_alums)
-    print_percentage('Hispanic or Latinx', hispanic_or_latinx_alums, total_alums)
-    print_percentage('Middle Eastern', middle_eastern_alums, total_alums)
-    print_percentage('White', white_alums, total_alums)
-    print_percentage('Historically disadvantaged caste or scheduled caste', disadvantaged_caste, total_alums)
-    print_percentage('Historically disadvantaged tribe', disadvantaged_tribe, total_alums)
-
-def gender_identities_demographics(data):
+        counts['total_alums'] += 1
+        if schema.race_asian(row) == '1':
+            counts['asian_alums'] += 1
+        if schema.race_black(row) == '1':
+            counts['black_alums'] += 1
+        if schema.race_hispanic_or_latinx(row) == '1':
+            counts['hispanic_or_latinx_alums'] += 1
+        if schema.race_indigenous(row) == '1':
+            counts['indigenous_alums'] += 1
+        if schema.race_middle_eastern(row) == '1':
+            counts['middle_eastern_alums'] += 1
+        if schema.race_white(row) == '1':
+            counts['white_alums'] += 1
+        if schema.disadvantaged_caste(row) == 'Yes':
+            counts['disadvantaged_caste'] += 1
+        if schema.disadvantaged_tribe(row) == 'Yes':
+            counts['disadvantaged_tribe'] += 1
+
+def race_and_ethnicity_demographics(counts, data, schema):
+    print('Total alums: {}'.format(counts['total_alums']))
+    print_percentage('Asian', counts['asian_alums'], counts['total_alums'])
+    print_percentage('Black', counts['black_alums'], counts['total_alums'])
+    print_percentage('Hispanic or Latinx', counts['hispanic_or_latinx_alums'], counts['total_alums'])
+    print_percentage('Middle Eastern', counts['middle_eastern_alums'], counts['total_alums'])
+    print_percentage('White', counts['white_alums'], counts['total_alums'])
+    print_percentage('Historically disadvantaged caste or scheduled caste', counts['disadvantaged_caste'], counts['total_alums'])
+    print_percentage('Historically disadvantaged tribe', counts['disadvantaged_tribe'], counts['total_alums'])
+
+def count_gender_identities(data, counts, schema):
     # demographics:
     # 'What is your gender identity? (Select all that apply)/Woman'
-    total_alums = 0
-    men_alums = 0
-    women_alums = 0
-    non_binary_alums = 0
-    other_gender_identity = 0
-    cis_alums = 0
-    trans_alums = 0
     for index, row in enumerate(data):
-        total_alums += 1
-        if row['What is your gender identity? (Select all that apply)/Man'] == '1':
-            men_alums += 1
-        if row['What is your gender identity? (Select all that apply)/Woman'] == '1':
-            women_alums += 1
-        if row['What is your gender identity? (Select all that apply)/Non-binary'] == '1':
-            non_binary_alums += 1
-        if row["What is your gender identity? (Select all that apply)/My gender isn't listed here"] == '1':
-            other_gender_identity += 1
-
-        if row['Do you identify as transgender?'] == 'No':
-            cis_alums += 1
-        elif row['Do you identify as transgender?'] == 'Yes':
-            trans_alums += 1
-
+        counts['total_alums'] += 1
+        if schema.gender_man(row) == '1':
+            counts['men_alums'] += 1
+        if schema.gender_woman(row) == '1':
+            counts['women_alums'] += 1
+        if schema.gender_non_binary(row) == '1':
+            counts['non_binary_alums'] += 1
+        if schema.gender_not_listed(row) == '1':
+            counts['other_gender_identity'] += 1
+
+        if schema.transgender(row) == 'No':
+            counts['cis_alums'] += 1
+        elif schema.transgender(row) == 'Yes':
+            counts['trans_alums'] += 1
+
+def gender_identities_demographics(counts, data, schema):
     print("")
     print("Gender Identities")
     print("---")
-    print_percentage('Men', men_alums, total_alums)
-    print_percentage('Women', women_alums, total_alums)
-    print_percentage('Non-binary', non_binary_alums, total_alums)
-    print_percentage('Other gender identity', other_gender_identity, total_alums)
-    print_percentage('Cisgender', cis_alums, total_alums)
-    print_percentage('Transgender', trans_alums, total_alums)
-
-def before_outreachy_statistics(data):
+    print_percentage('Men', counts['men_alums'], counts['total_alums'])
+    print_percentage('Women', counts['women_alums'], counts['total_alums'])
+    print_percentage('Non-binary', counts['non_binary_alums'], counts['total_alums'])
+    print_percentage('Other gender identity', counts['other_gender_identity'], counts['total_alums'])
+    print_percentage('Cisgender', counts['cis_alums'], counts['total_alums'])
+    print_percentage('Transgender', counts['trans_alums'], counts['total_alums'])
+
+def count_before_outreachy(data, counts, schema):
     # overview:
     # 'In the three months before your Outreachy internship, were you:'
     #  - "A student"
@@ -107,41 +119,38 @@ def before_outreachy_statistics(data):
     #  - "Unemployed"
     #  - "Other"
     #  - "A full-time parent"
-    student_applicants = 0
-    employed_applicants = 0
-    unemployed_applicants = 0
-    other_applicants = 0
-    parent_applicants = 0
-    total_applicants = 0
-
+    for index, row in enumerate(data):
+        counts['total_applicants'] += 1
+        if schema.before_status(row) == 'A student':
+            counts['student_applicants'] += 1
+        elif schema.before_status(row) == 'Employed':
+            counts['employed_applicants'] += 1
+        elif schema.before_status(row) == 'Unemployed':
+            counts['unemployed_applicants'] += 1
+        elif schema.before_status(row) == 'A full time parent':
+            counts['parent_applicants'] += 1
+        elif schema.before_status(row) == 'Other':
+            counts['other_applicants'] += 1
+
+def before_outreachy_statistics(counts, data, schema):
     print()
     print("Before Outreachy")
     print("---")
     print()
 
     for index, row in enumerate(data):
-        total_applicants += 1
-        if row['In the three months before your Outreachy internship, were you:'] == 'A student':
-            student_applicants += 1
-        elif row['In the three months before your Outreachy internship, were you:'] == 'Employed':
-            employed_applicants += 1
-        elif row['In the three months before your Outreachy internship, were you:'] == 'Unemployed':
-            unemployed_applicants += 1
-        elif row['In the three months before your Outreachy internship, were you:'] == 'A full time parent':
-            parent_applicants += 1
-        elif row['In the three months before your Outreachy internship, were you:'] == 'Other':
-            other_applicants += 1
-            print("Other:", row['In the three months before your Outreachy internship, what was your employment or educational situation?'])
+        if schema.before_status(row) == 'Other':
+            print("Other:", schema.before_situation(row))
 
     print()
-    print('Total alums: {}'.format(total_applicants))
-    print_percentage('Students', student_applicants, total_applicants)
-    print_percentage('Employed', employed_applicants, total_applicants)
-    print_percentage('Unemployed', unemployed_applicants, total_applicants)
-    print_percentage('Parents', parent_applicants, total_applicants)
-    print_percentage('Other', other_applicants, total_applicants)
-
-def retention_statistics(data):
+    print('Total alums: {}'.format(counts['total_applicants']))
+    print_percentage('Students', counts['student_applicants'], counts['total_applicants'])
+    print_percentage('Employed', counts['employed_applicants'], counts['total_applicants'])
+    print_percentage('Unemployed', counts['unemployed_applicants'], counts['total_applicants'])
+    print_percentage('Parents', counts['parent_applicants'], counts['total_applicants'])
+    print_percentage('Other', counts['other_applicants'], counts['total_applicants'])
+
+def count_retention(data, counts, schema):
     # overview:
     # 'Are you currently:'
     #  - "A student"
@@ -149,218 +158,449 @@ def retention_statistics(data):
     #  - "Unemployed"
     #  - "Other"
     #  - "A full-time parent"
-    student_alums = 0
-    stem_student_alums = 0
-    student_alums_who_use_foss_in_school = 0
-    student_alums_who_contribute_to_foss_in_school = 0
-    employed_alums = 0
-    tech_employed_alums = 0
-    sponsor_employed_alums = 0
-    employed_alums_who_use_foss_at_work = 0
-    employed_alums_who_contribute_to_foss_at_work = 0
-    unemployed_alums = 0
-    other_alums = 0
-    parent_alums = 0
-    total_alums = 0
-
+    for index, row in enumerate(data):
+        counts['total_alums'] += 1
+        if schema.current_status(row) == 'A student':
+            counts['student_alums'] += 1
+            if schema.stem_student(row) == 'Yes':
+                counts['stem_student_alums'] += 1
+            if schema.student_uses_foss(row) == 'Yes':
+                counts['student_alums_who_use_foss_in_school'] += 1
+            if schema.student_contributes_to_foss(row) == 'Yes':
+                counts['student_alums_who_contribute_to_foss_in_school'] += 1
+        elif schema.current_status(row) == 'Employed':
+            counts['employed_alums'] += 1
+            if schema.tech_employee(row) == 'Yes':
+                counts['tech_employed_alums'] += 1
+            if schema.no_sponsor_employer(row) != '1':
+                counts['sponsor_employed_alums'] += 1
+            if schema.job_uses_foss(row) == 'Yes':
+                counts['employed_alums_who_use_foss_at_work'] += 1
+            if schema.job_contributes_to_foss(row) == 'Yes':
+                counts['employed_alums_who_contribute_to_foss_at_work'] += 1
+        elif schema.current_status(row) == 'Unemployed':
+            counts['unemployed_alums'] += 1
+        elif schema.current_status(row) == 'A full-time parent':
+            counts['parent_alums'] += 1
+        elif schema.current_status(row) == 'Other':
+            counts['other_alums'] += 1
+
+def retention_statistics(counts, data, schema):
     print()
     print("Current Employment and Education status of alums")
     print("---")
     print()
     for index, row in enumerate(data):
-        total_alums += 1
-        if row['Are you currently:'] == 'A student':
-            student_alums += 1
-            if row['Are you a student in a science, technology, engineering, or mathematics field?'] == 'Yes':
-                stem_student_alums += 1
-            if row['Do you use free software / open source to complete your student projects or research?'] == 'Yes':
-                student_alums_who_use_foss_in_school += 1
-            if row['Do you contribute to free software / open source as part of your student projects or research?'] == 'Yes':
-                student_alums_who_contribute_to_foss_in_school += 1
-        elif row['Are you currently:'] == 'Employed':
-            employed_alums += 1
-            if row['Are you employed in the technology industry?'] == 'Yes':
-                tech_employed_alums += 1
-            if row['After your Outreachy internship, were you employed at any of the following Outreachy sponsors?/None of the above'] != '1':
-                sponsor_employed_alums += 1
-            if row['Does your job involve using free software / open source?'] == 'Yes':
-                employed_alums_who_use_foss_at_work += 1
-            if row['Does your job involve contributing to free software / open source?'] == 'Yes':
-                employed_alums_who_contribute_to_foss_at_work += 1
-        elif row['Are you currently:'] == 'Unemployed':
-            unemployed_alums += 1
-        elif row['Are you currently:'] == 'A full-time parent':
-            parent_alums += 1
-        elif row['Are you currently:'] == 'Other':
-            other_alums += 1
-            print("Other:", row['What is your current employment or educational situation?'])
+        if schema.current_status(row) == 'Other':
+            print("Other:", schema.current_situation(row))
 
     print()
-    print('Total alums: {}'.format(total_alums))
-    print_percentage('Students', student_alums, total_alums)
-    print_percentage(' - STEM students', stem_student_alums, student_alums)
-    print_percentage(' - Students who use FOSS for school projects or research', student_alums_who_use_foss_in_school, student_alums)
-    print_percentage(' - Students who contribute to FOSS for school projects or research', student_alums_who_contribute_to_foss_in_school, student_alums)
-    print_percentage('Employed', employed_alums, total_alums)
-    print_percentage(' - Tech employees', tech_employed_alums, employed_alums)
-    print_percentage(' - Employed by sponsor after internship', sponsor_employed_alums, employed_alums)
-    print_percentage(' - Employees who use FOSS as part of their job', employed_alums_who_use_foss_at_work, employed_alums)
-    print_percentage(' - Employees who contribute to FOSS as part of their job', employed_alums_who_contribute_to_foss_at_work, employed_alums)
-    print_percentage('Unemployed', unemployed_alums, total_alums)
-    print_percentage('Parents', parent_alums, total_alums)
-
-def foss_retention(data):
-    total_alums = 0
-    use_foss = 0
-    contribute_to_foss = 0
-    do_not_contribute_to_foss = 0
+    print('Total alums: {}'.format(counts['total_alums']))
+    print_percentage('Students', counts['student_alums'], counts['total_alums'])
+    print_percentage(' - STEM students', counts['stem_student_alums'], counts['student_alums'])
+    print_percentage(' - Students who use FOSS for school projects or research', counts['student_alums_who_use_foss_in_school'], counts['student_alums'])
+    print_percentage(' - Students who contribute to FOSS for school projects or research', counts['student_alums_who_contribute_to_foss_in_school'], counts['student_alums'])
+    print_percentage('Employed', counts['employed_alums'], counts['total_alums'])
+    print_percentage(' - Tech employees', counts['tech_employed_alums'], counts['employed_alums'])
+    print_percentage(' - Employed by sponsor after internship', counts['sponsor_employed_alums'], counts['employed_alums'])
+    print_percentage(' - Employees who use FOSS as part of their job', counts['employed_alums_who_use_foss_at_work'], counts['employed_alums'])
+    print_percentage(' - Employees who contribute to FOSS as part of their job', counts['employed_alums_who_contribute_to_foss_at_work'], counts['employed_alums'])
+    print_percentage('Unemployed', counts['unemployed_alums'], counts['total_alums'])
+    print_percentage('Parents', counts['parent_alums'], counts['total_alums'])
+
+def count_foss_retention(data, counts, schema):
+    for index, row in enumerate(data):
+        counts['total_alums'] += 1
+
+        if schema.used_foss(row) == 'Yes':
+            counts['use_foss'] += 1
+
+        if schema.contributed_to_foss(row) == 'No, I have not contributed to free software / open source in the last year':
+            counts['do_not_contribute_to_foss'] += 1
+        elif schema.contributed_to_foss(row) != '':
+            counts['contribute_to_foss'] += 1
 
+def foss_retention(counts, data, schema):
     print()
     print("Retention in FOSS")
     print("---")
     print()
-    for index, row in enumerate(data):
-        total_alums += 1
-
-        if row['In the last year, have you used free software / open source?'] == 'Yes':
-            use_foss += 1
-
-        if row['In the last year, have you contributed to free software / open source with:'] == 'No, I have not contributed to free software / open source in the last year':
-            do_not_contribute_to_foss += 1
-        elif row['In the last year, have you contributed to free software / open source with:'] != '':
-            contribute_to_foss += 1
-
-    print('Total alums: {}'.format(total_alums))
-    print_percentage('Uses FOSS', use_foss, total_alums)
-    print_percentage('Contributes to FOSS', contribute_to_foss, total_alums)
-    print_percentage('Does not contribute to FOSS', do_not_contribute_to_foss, total_alums)
-
-def gsoc_and_gsod_connections(data):
-    total_alums = 0
-    gsoc_intern = 0
-    gsoc_mentor = 0
-    gsoc_admin = 0
-    gsod_intern = 0
-    gsod_mentor = 0
-    gsod_admin = 0
+    print('Total alums: {}'.format(counts['total_alums']))
+    print_percentage('Uses FOSS', counts['use_foss'], counts['total_alums'])
+    print_percentage('Contributes to FOSS', counts['contribute_to_foss'], counts['total_alums'])
+    print_percentage('Does not contribute to FOSS', counts['do_not_contribute_to_foss'], counts['total_alums'])
 
+def count_gsoc_and_gsod_connections(data, counts, schema):
+    for index, row in enumerate(data):
+        counts['total_alums'] += 1
+
+        if schema.gsoc_intern(row) == '1':
+            counts['gsoc_intern'] += 1
+        if schema.gsoc_mentor(row) == '1':
+            counts['gsoc_mentor'] += 1
+        if schema.gsoc_admin(row) == '1':
+            counts['gsoc_admin'] += 1
+        if schema.gsod_intern(row) == '1':
+            counts['gsod_intern'] += 1
+        if schema.gsod_mentor(row) == '1':
+            counts['gsod_mentor'] += 1
+        if schema.gsod_admin(row) == '1':
+            counts['gsod_admin'] += 1
+
+def gsoc_and_gsod_connections(counts, data, schema):
     print()
     print("Connection to GSoC and GSoD")
     print("---")
     print()
+    print('Total alums: {}'.format(counts['total_alums']))
+    print_percentage('Google Summer of Code intern after Outreachy', counts['gsoc_intern'], counts['total_alums'])
+    print_percentage('Google Summer of Code mentor after Outreachy', counts['gsoc_mentor'], counts['total_alums'])
+    print_percentage('Google Summer of Code org admin after Outreachy', counts['gsoc_admin'], counts['total_alums'])
+    print_percentage('Google Season of Docs intern after Outreachy', counts['gsod_intern'], counts['total_alums'])
+    print_percentage('Google Season of Docs mentor after Outreachy', counts['gsod_mentor'], counts['total_alums'])
+    print_percentage('Google Season of Docs org admin after Outreachy', counts['gsod_admin'], counts['total_alums'])
+
+def count_foss_talks(data, counts, schema):
     for index, row in enumerate(data):
-        total_alums += 1
-
-        if row['After your Outreachy internship, did you participate in Google Summer of Code? (Select all that apply)/Yes, I was a GSoD intern'] == '1':
-            gsoc_intern += 1
-        if row['After your Outreachy internship, did you participate in Google Summer of Code? (Select all that apply)/Yes, I was a GSoD mentor'] == '1':
-            gsoc_mentor += 1
-        if row['After your Outreachy internship, did you participate in Google Summer of Code? (Select all that apply)/Yes, I was a GSoD org admin'] == '1':
-            gsoc_admin += 1
-        if row['After your Outreachy internship, did you participate in Google Season of Docs? (Select all that apply)/Yes, I was a GSoD intern'] == '1':
-            gsod_intern += 1
-        if row['After your Outreachy internship, did you participate in Google Season of Docs? (Select all that apply)/Yes, I was a GSoD mentor'] == '1':
-            gsod_mentor += 1
-        if row['After your Outreachy internship, did you participate in Google Season of Docs? (Select all that apply)/Yes, I was a GSoD org admin'] == '1':
-            gsod_admin += 1
-
-    print('Total alums: {}'.format(total_alums))
-    print_percentage('Google Summer of Code intern after Outreachy', gsoc_intern, total_alums)
-    print_percentage('Google Summer of Code mentor after Outreachy', gsoc_mentor, total_alums)
-    print_percentage('Google Summer of Code org admin after Outreachy', gsoc_admin, total_alums)
-    print_percentage('Google Season of Docs intern after Outreachy', gsod_intern, total_alums)
-    print_percentage('Google Season of Docs mentor after Outreachy', gsod_mentor, total_alums)
-    print_percentage('Google Season of Docs org admin after Outreachy', gsod_admin, total_alums)
-
-def foss_talks(data):
-    total_alums = 0
-    gave_talk = 0
+        counts['total_alums'] += 1
+
+        if schema.gave_talk(row) == 'Yes':
+            counts['gave_talk'] += 1
 
+def foss_talks(counts, data, schema):
     print()
     print("Conference talks on FOSS")
     print("---")
     print()
-    for index, row in enumerate(data):
-        total_alums += 1
-
-        if row['During or after your Outreachy internship, did you give a talk or presentation on free software/open source?'] == 'Yes':
-            gave_talk += 1
-
-    print('Total alums: {}'.format(total_alums))
-    print_percentage('Gave a conference talks or presentation on FOSS', gave_talk, total_alums)
-
-def mentorship(data):
-    total_alums = 0
-    outreachy_coordinator = 0
-    outreachy_mentor = 0
-    outreachy_volunteer = 0
-    generic_mentor = 0
+    print('Total alums: {}'.format(counts['total_alums']))
+    print_percentage('Gave a conference talks or presentation on FOSS', counts['gave_talk'], counts['total_alums'])
 
+def count_mentorship(data, counts, schema):
+    for index, row in enumerate(data):
+        counts['total_alums'] += 1
+
+        if schema.outreachy_coordinator(row) == '1':
+            counts['outreachy_coordinator'] += 1
+        if schema.outreachy_mentor(row) == '1':
+            counts['outreachy_mentor'] += 1
+        if schema.outreachy_volunteer(row) == '1':
+            counts['outreachy_volunteer'] += 1
+        if schema.became_mentor(row).startswith('Yes'):
+            counts['generic_mentor'] += 1
+
+def mentorship(counts, data, schema):
     print()
     print("Mentorship")
     print("---")
     print()
     for index, row in enumerate(data):
-        total_alums += 1
-
-        if row['After your Outreachy internship, did you volunteer for Outreachy? (Select all that apply)/Yes, I was an Outreachy coordinator'] == '1':
-            outreachy_coordinator += 1
-            print(row['First Name / Given Name'], row['Last Name / Family Name'], "Outreachy coordinator")
-        if row['After your Outreachy internship, did you volunteer for Outreachy? (Select all that apply)/Yes, I was an Outreachy mentor'] == '1':
-            outreachy_mentor += 1
-            print(row['First Name / Given Name'], row['Last Name / Family Name'], "Outreachy mentor")
-        if row['After your Outreachy internship, did you volunteer for Outreachy? (Select all that apply)/Yes, I was an informal Outreachy volunteer'] == '1':
-            outreachy_volunteer += 1
-        if row['After your Outreachy internship, did you become a mentor?'].startswith('Yes'):
-            generic_mentor += 1
-
-    print('Total alums: {}'.format(total_alums))
-    print_percentage('Became Outreachy coordinator', outreachy_coordinator, total_alums)
-    print_percentage('Became Outreachy mentor', outreachy_mentor, total_alums)
-    print_percentage('Became Outreachy volunteer', outreachy_volunteer, total_alums)
-    print_percentage('Became a mentor', generic_mentor, total_alums)
-
-def print_successes(data):
+        if schema.outreachy_coordinator(row) == '1':
+            print(schema.first_name(row), schema.last_name(row), "Outreachy coordinator")
+        if schema.outreachy_mentor(row) == '1':
+            print(schema.first_name(row), schema.last_name(row), "Outreachy mentor")
+
+    print('Total alums: {}'.format(counts['total_alums']))
+    print_percentage('Became Outreachy coordinator', counts['outreachy_coordinator'], counts['total_alums'])
+    print_percentage('Became Outreachy mentor', counts['outreachy_mentor'], counts['total_alums'])
+    print_percentage('Became Outreachy volunteer', counts['outreachy_volunteer'], counts['total_alums'])
+    print_percentage('Became a mentor', counts['generic_mentor'], counts['total_alums'])
+
+# Each statistics section has a name (used as its key in the saved state),
+# a function that folds rows into a Counter, and a function that prints the
+# report from that Counter. The report functions are also handed the rows
+# that were just counted, so they can print free-text "Other" answers and
+# names for those rows. Rows are tuples, read through the surveySchema
+# accessors in longitudinalsurveyschema.py.
+sections = [
+    ('race_and_ethnicity', count_race_and_ethnicity, race_and_ethnicity_demographics),
+    ('gender_identities', count_gender_identities, gender_identities_demographics),
+    ('before_outreachy', count_before_outreachy, before_outreachy_statistics),
+    ('retention', count_retention, retention_statistics),
+    ('foss_retention', count_foss_retention, foss_retention),
+    ('gsoc_and_gsod_connections', count_gsoc_and_gsod_connections, gsoc_and_gsod_connections),
+    ('foss_talks', count_foss_talks, foss_talks),
+    ('mentorship', count_mentorship, mentorship),
+]
+
+def bootstrap_counts(data, schema, resamples):
+    """Count every section's metrics in resamples of the survey responses.
+
+    Returns a dict of section name -> metric name -> numpy array holding
+    the count of that metric in each resample."""
+    # Count each response on its own, giving a responses x metrics matrix.
+    single_counts = []
+    metrics = {}
+    for index, row in enumerate(data):
+        for name, count, report in sections:
+            counts = Counter()
+            count([row], counts, schema)
+            single_counts.append((index, name, counts))
+            for metric in counts:
+                metrics.setdefault((name, metric), len(metrics))
+    responses = numpy.zeros((len(data), len(metrics)))
+    for index, name, counts in single_counts:
+        for metric, value in counts.items():
+            responses[index, metrics[(name, metric)]] = value
+
+    # Draw all resamples at once: row i of picks holds the response indexes
+    # in resample i. Turn that into how many times each response was picked
+    # in each resample, and count every metric in every resample with one
+    # matrix multiplication.
+    n = len(data)
+    picks = numpy.random.default_rng().integers(0, n, size=(resamples, n))
+    picks += numpy.arange(resamples)[:, numpy.newaxis] * n
+    weights = numpy.bincount(picks.ravel(), minlength=resamples * n).reshape(resamples, n)
+    resampled = weights @ responses
+
+    results = {}
+    for (name, metric), column in metrics.items():
+        results.setdefault(name, {})[metric] = resampled[:, column]
+    return results
+
+def answered_questions(row):
+    return sum(1 for answer in row if answer.strip())
+
+# Date formats the survey tools export the submission date in.
+submitted_formats = ['%Y-%m-%d %H:%M:%S', '%Y-%m-%d %H:%M', '%Y-%m-%d', '%Y-%m-%dT%H:%M:%S',
+                     '%m/%d/%Y %H:%M:%S', '%m/%d/%Y %H:%M', '%m/%d/%Y']
+
+def submitted_date(row, schema):
+    """When the response was submitted, or None if the CSV has no
+    submission date column or the date can't be parsed."""
+    text = schema.submitted(row).strip()
+    for date_format in submitted_formats:
+        try:
+            return datetime.datetime.strptime(text, date_format)
+        except ValueError:
+            pass
+    return None
+
+def newest(group, data, schema):
+    # Only go by submission date if every response in the group has one.
+    # Otherwise, later rows in the export count as newer.
+    dates = dict((index, submitted_date(data[index], schema)) for index in group)
+    if None in dates.values():
+        return max(group)
+    return max(group, key=lambda index: (dates[index], index))
+
+def most_complete(group, data, schema):
+    answered = dict((index, answered_questions(data[index])) for index in group)
+    most = max(answered.values())
+    return newest([index for index in group if answered[index] == most], data, schema)
+
+# How to pick which response to keep when an alum answered more than once.
+# Each function is given the indexes of one alum's responses, and returns
+# the index of the response to keep.
+duplicate_policies = {
+    'newest': newest,
+    'complete': most_complete,
+    'first': lambda group, data, schema: min(group),
+}
+
+def response_keys(row, schema):
+    """Keys that identify the alum who sent a response: their normalized
+    email, and their normalized name with the round and community."""
+    keys = []
+    email = normalize_email(schema.email(row))
+    if email:
+        keys.append('\x1f'.join(['email', email]))
+    name = normalize_name(schema.first_name(row) + ' ' + schema.last_name(row))
+    if name:
+        keys.append('\x1f'.join(['name', name, schema.round(row).strip().lower(), schema.community(row).strip().lower()]))
+    return keys
+
+def deduplicate(data, schema, policy):
+    """Find alums who submitted the survey more than once, and keep one response each.
+
+    Two responses are from the same alum if their normalized email addresses
+    match, or if their normalized names, round, and community all match.
+    Returns the kept responses in their original order, and a list of
+    (kept response, [dropped responses]) for every alum with duplicates."""
+    # Union-find over response indexes: one pass through the responses,
+    # joining each one to the first response that had the same email or name.
+    parent = list(range(len(data)))
+    def find(index):
+        while parent[index] != index:
+            parent[index] = parent[parent[index]]
+            index = parent[index]
+        return index
+
+    first_seen = {}
+    for index, row in enumerate(data):
+        for key in response_keys(row, schema):
+            if key in first_seen:
+                parent[find(index)] = find(first_seen[key])
+            else:
+                first_seen[key] = index
+
+    groups = {}
+    for index in range(len(data)):
+        groups.setdefault(find(index), []).append(index)
+
+    choose = duplicate_policies[policy]
+    kept = []
+    merged = []
+    for group in groups.values():
+        keep = choose(group, data, schema)
+        kept.append(keep)
+        if len(group) > 1:
+            merged.append((data[keep], [data[index] for index in group if index != keep]))
+    kept.sort()
+    return [data[index] for index in kept], merged
+
+def print_duplicates(merged, schema, policy):
+    def describe(row):
+        return '{} {} <{}> ({} {})'.format(schema.first_name(row), schema.last_name(row),
+                                           schema.email(row), schema.round(row), schema.community(row))
+    print('Merged', sum(len(dropped) for kept, dropped in merged),
+          'duplicate responses from', len(merged), 'alums (--duplicates ' + policy + '):')
+    for kept, dropped in merged:
+        print('Kept:', describe(kept))
+        for row in dropped:
+            print('  Dropped:', describe(row))
+    print()
+
+def row_fingerprint(row):
+    # Hash every answer in the row, in column order, so an edited response
+    # gets a new fingerprint. The unit separator can't appear in a CSV cell
+    # exported by the survey tool.
+    return hashlib.sha1('\x1f'.join(row).encode('utf-8')).hexdigest()
+
+def load_state(path):
+    # Each counted response is kept in 'responses' by fingerprint, with the
+    # keys of the alum who sent it and what it added to each section's
+    # counts, so a newer response from the same alum can replace it.
+    state = {'fingerprints': [], 'counts': {}, 'responses': {}}
+    if path and os.path.exists(path):
+        with open(path, 'r') as stateFile:
+            state = json.load(stateFile)
+    return state
+
+def replace_responses(state, replaced):
+    """Take the responses with the replaced fingerprints back out of the counts."""
+    for fingerprint in replaced:
+        response = state['responses'].pop(fingerprint)
+        for name, counted in response['counts'].items():
+            counts = Counter(state['counts'].get(name, {}))
+            counts.subtract(counted)
+            state['counts'][name] = +counts
+    state['fingerprints'] = [fingerprint for fingerprint in state['fingerprints'] if fingerprint not in replaced]
+
+def record_responses(state, data, schema):
+    for row in data:
+        fingerprint = row_fingerprint(row)
+        response = state['responses'].setdefault(fingerprint, {'keys': response_keys(row, schema), 'counts': {}})
+        for name, count, report in sections:
+            counts = Counter(response['counts'].get(name, {}))
+            count([row], counts, schema)
+            response['counts'][name] = counts
+
+def save_state(path, state):
+    # Write to a temporary file and rename it over the old state,
+    # so an interrupted run doesn't leave a half-written state file.
+    tmppath = path + '.tmp'
+    with open(tmppath, 'w') as stateFile:
+        json.dump(state, stateFile)
+    os.replace(tmppath, path)
+
+def print_successes(data, schema):
     print()
     print("Success stories")
     print("---")
     print()
     for index, row in enumerate(data):
-        if row['After your Outreachy internship, did you win any awards?'] != '':
-            print("Award:", row['First Name / Given Name'], row['Last Name / Family Name'], row['After your Outreachy internship, did you win any awards?'])
+        if schema.awards(row) != '':
+            print("Award:", schema.first_name(row), schema.last_name(row), schema.awards(row))
 
-        if row['After your Outreachy internship, did you take on any leadership roles?'] != '':
-            print("Leadership role:", row['First Name / Given Name'], row['Last Name / Family Name'], row['After your Outreachy internship, did you take on any leadership roles?'])
+        if schema.leadership_roles(row) != '':
+            print("Leadership role:", schema.first_name(row), schema.last_name(row), schema.leadership_roles(row))
 
-        if row['Tell us more about your successes after Outreachy!'] != '':
-            print("Success story:", row['First Name / Given Name'], row['Last Name / Family Name'], row['Tell us more about your successes after Outreachy!'])
+        if schema.success_story(row) != '':
+            print("Success story:", schema.first_name(row), schema.last_name(row), schema.success_story(row))
 
-        if row['After your Outreachy internship, did you win any awards?'] != '' or row['After your Outreachy internship, did you take on any leadership roles?'] != '' or row['Tell us more about your successes after Outreachy!'] != '':
+        if schema.awards(row) != '' or schema.leadership_roles(row) != '' or schema.success_story(row) != '':
             print()
 
 def main():
     parser = argparse.ArgumentParser(description='Print statistics from 2019 Outreachy longitudinal survey')
     parser.add_argument('--csv', help='CSV file of longitudinal survey responses')
     parser.add_argument('--successes', help='Use `--successes 1` to print awards, leadership positions, and success stories of Outreachy alums')
+    parser.add_argument('--bootstrap', help='Print a confidence interval for each percentage, computed from this many bootstrap resamples of the responses (e.g. 5000). Requires numpy.', type=int, default=0)
+    parser.add_argument('--confidence', help='Confidence level for --bootstrap intervals, in percent', type=float, default=95)
+    parser.add_argument('--duplicates', help='Which response to count when an alum submitted the survey more than once: newest (the default), complete (the one with the most questions answered), first, or none to count every response', choices=['newest', 'complete', 'first', 'none'], default='newest')
+    parser.add_argument('--state', help='JSON file to save the counts and seen responses in. On later runs, only responses that are new since the last run are counted, and "Other" answers, names, and success stories are only printed for the new responses. Delete the file to recount from scratch.')
     args = parser.parse_args()
 
-    data = []
-    with open(args.csv, 'r') as csvFile:
-        freader = csv.DictReader(csvFile, delimiter=';', quotechar='"')
-        for row in freader:
+    state = load_state(args.state)
+    seen = set(state['fingerprints'])
+
+    schema, rows = read_survey(args.csv)
+    if args.duplicates != 'none':
+        rows, merged = deduplicate(rows, schema, args.duplicates)
+        if merged:
+            print_duplicates(merged, schema, args.duplicates)
+
+    # Without --state every response in the CSV is counted. With it, only
+    # responses that weren't counted by an earlier run are; identical rows
+    # in this CSV are left to --duplicates.
+    data = rows
+    if args.state:
+        # Which counted response each alum's keys belong to.
+        counted_by = {}
+        for fingerprint, response in state['responses'].items():
+            for key in response['keys']:
+                counted_by.setdefault(key, set()).add(fingerprint)
+        data = []
+        fingerprints = set()
+        replaced = set()
+        for row in rows:
+            fingerprint = row_fingerprint(row)
+            fingerprints.add(fingerprint)
+            if args.duplicates != 'none':
+                for key in response_keys(row, schema):
+                    replaced.update(counted_by.get(key, ()))
+            if fingerprint in seen:
+                continue
+            state['fingerprints'].append(fingerprint)
             data.append(row)
-
-    race_and_ethnicity_demographics(data)
-    gender_identities_demographics(data)
-    before_outreachy_statistics(data)
-    retention_statistics(data)
-    foss_retention(data)
-    gsoc_and_gsod_connections(data)
-    foss_talks(data)
-    mentorship(data)
+        # Counted responses from the same alums as the kept responses are
+        # replaced by them, unless they're the ones kept.
+        replaced -= fingerprints
+        if replaced:
+            replace_responses(state, replaced)
+            print('Replaced', len(replaced), 'responses counted in', args.state, 'with newer responses from the same alums')
+
+        missing = len(seen - fingerprints - replaced)
+        if missing:
+            print('Warning:', missing, 'responses counted in', args.state, 'are missing from', args.csv)
+            print('Edited or deleted responses are still counted. Remove', args.state, 'to recount.')
+        record_responses(state, data, schema)
+        print('New responses since last run:', len(data))
+        print()
+
+    # Confidence intervals are computed from every response in the CSV,
+    # not only the responses that are new since the last --state run.
+    resampled = {}
+    if args.bootstrap:
+        if numpy is None:
+            sys.exit('--bootstrap requires numpy')
+        if rows:
+            resampled = bootstrap_counts(rows, schema, args.bootstrap)
+
+    for name, count, report in sections:
+        counts = Counter(state['counts'].get(name, {}))
+        count(data, counts, schema)
+        state['counts'][name] = counts
+        if name in resampled:
+            counts = Counter(dict((metric, bootstrapCount(value, resampled[name].get(metric, 0), args.confidence))
+                                  for metric, value in counts.items()))
+        report(counts, data, schema)
 
     if args.successes == '1':
-        print_successes(data)
+        print_successes(data, schema)
+
+    if args.state:
+        save_state(args.state, state)
 
 if __name__ == "__main__":
     main()
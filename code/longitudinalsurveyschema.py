@@ -0,0 +1,169 @@
+# Copyright 2020 Sage Sharp <sharp@otter.technology>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Column names of the longitudinal survey CSV exports.
+#
+# The survey questions get reworded between survey years, and the 2019
+# export has GSoC answers labeled as "GSoD". Scripts refer to columns by
+# a short name, and this file lists every header that name has had.
+# When a CSV is loaded, each short name is looked up in the header once,
+# and turned into a function that pulls that column out of a row tuple.
+
+import csv
+import re
+import sys
+import unicodedata
+from operator import itemgetter
+
+# Short name -> list of CSV headers used for that question, newest first.
+survey_columns = {
+    'first_name': ['First Name / Given Name'],
+    'last_name': ['Last Name / Family Name'],
+    'email': ['Email address'],
+    'round': ['Which Outreachy round did you participate in?'],
+    'community': ['Which community did you intern with?'],
+    'submitted': ['Date submitted', 'Date Submitted', 'Submission date'],
+
+    'race_asian': ['What is your race and ethnicity? (Select all that apply)/Asian'],
+    'race_black': ['What is your race and ethnicity? (Select all that apply)/Black'],
+    'race_hispanic_or_latinx': ['What is your race and ethnicity? (Select all that apply)/Hispanic or Latinx'],
+    'race_indigenous': ['What is your race and ethnicity? (Select all that apply)/Indigenous'],
+    'race_middle_eastern': ['What is your race and ethnicity? (Select all that apply)/Middle Eastern'],
+    'race_white': ['What is your race and ethnicity? (Select all that apply)/White'],
+    'disadvantaged_caste': ['Are you a member of a historically disadvantaged caste / scheduled caste?'],
+    'disadvantaged_tribe': ['Are you a member of a historically disadvantaged tribe?'],
+
+    'gender_man': ['What is your gender identity? (Select all that apply)/Man'],
+    'gender_woman': ['What is your gender identity? (Select all that apply)/Woman'],
+    'gender_non_binary': ['What is your gender identity? (Select all that apply)/Non-binary'],
+    'gender_not_listed': ["What is your gender identity? (Select all that apply)/My gender isn't listed here"],
+    'transgender': ['Do you identify as transgender?'],
+
+    'before_status': ['In the three months before your Outreachy internship, were you:'],
+    'before_situation': ['In the three months before your Outreachy internship, what was your employment or educational situation?'],
+
+    'current_status': ['Are you currently:'],
+    'current_situation': ['What is your current employment or educational situation?'],
+    'stem_student': ['Are you a student in a science, technology, engineering, or mathematics field?'],
+    'student_uses_foss': ['Do you use free software / open source to complete your student projects or research?'],
+    'student_contributes_to_foss': ['Do you contribute to free software / open source as part of your student projects or research?'],
+    'tech_employee': ['Are you employed in the technology industry?'],
+    'no_sponsor_employer': ['After your Outreachy internship, were you employed at any of the following Outreachy sponsors?/None of the above'],
+    'job_uses_foss': ['Does your job involve using free software / open source?'],
+    'job_contributes_to_foss': ['Does your job involve contributing to free software / open source?'],
+
+    'used_foss': ['In the last year, have you used free software / open source?'],
+    'contributed_to_foss': ['In the last year, have you contributed to free software / open source with:'],
+
+    'gsoc_intern': ['After your Outreachy internship, did you participate in Google Summer of Code? (Select all that apply)/Yes, I was a GSoC intern',
+                    'After your Outreachy internship, did you participate in Google Summer of Code? (Select all that apply)/Yes, I was a GSoD intern'],
+    'gsoc_mentor': ['After your Outreachy internship, did you participate in Google Summer of Code? (Select all that apply)/Yes, I was a GSoC mentor',
+                    'After your Outreachy internship, did you participate in Google Summer of Code? (Select all that apply)/Yes, I was a GSoD mentor'],
+    'gsoc_admin': ['After your Outreachy internship, did you participate in Google Summer of Code? (Select all that apply)/Yes, I was a GSoC org admin',
+                   'After your Outreachy internship, did you participate in Google Summer of Code? (Select all that apply)/Yes, I was a GSoD org admin'],
+    'gsod_intern': ['After your Outreachy internship, did you participate in Google Season of Docs? (Select all that apply)/Yes, I was a GSoD intern'],
+    'gsod_mentor': ['After your Outreachy internship, did you participate in Google Season of Docs? (Select all that apply)/Yes, I was a GSoD mentor'],
+    'gsod_admin': ['After your Outreachy internship, did you participate in Google Season of Docs? (Select all that apply)/Yes, I was a GSoD org admin'],
+
+    'gave_talk': ['During or after your Outreachy internship, did you give a talk or presentation on free software/open source?'],
+
+    'outreachy_coordinator': ['After your Outreachy internship, did you volunteer for Outreachy? (Select all that apply)/Yes, I was an Outreachy coordinator'],
+    'outreachy_mentor': ['After your Outreachy internship, did you volunteer for Outreachy? (Select all that apply)/Yes, I was an Outreachy mentor'],
+    'outreachy_volunteer': ['After your Outreachy internship, did you volunteer for Outreachy? (Select all that apply)/Yes, I was an informal Outreachy volunteer'],
+    'became_mentor': ['After your Outreachy internship, did you become a mentor?'],
+
+    'awards': ['After your Outreachy internship, did you win any awards?'],
+    'leadership_roles': ['After your Outreachy internship, did you take on any leadership roles?'],
+    'success_story': ['Tell us more about your successes after Outreachy!'],
+}
+
+# Columns that aren't in every export. Scripts check schema.missing
+# before relying on them.
+optional_columns = set(['submitted'])
+
+def missing_column(row):
+    return ''
+
+class surveySchema:
+    """Positional accessors for the survey columns found in one CSV header.
+
+    Each short name in names becomes an attribute holding a function that
+    returns that column from a row tuple, e.g. schema.email(row).
+    If required is False, columns missing from this CSV read as ''.
+    Otherwise, a ValueError lists every short name that has no header."""
+    def __init__(self, fieldnames, names=None, required=True):
+        self.fieldnames = fieldnames
+        positions = dict((header, index) for index, header in enumerate(fieldnames))
+        self.missing = []
+        for name in names or survey_columns:
+            for header in survey_columns[name]:
+                if header in positions:
+                    setattr(self, name, itemgetter(positions[header]))
+                    break
+            else:
+                self.missing.append(name)
+                setattr(self, name, missing_column)
+        missing_required = [name for name in self.missing if name not in optional_columns]
+        if required and missing_required:
+            raise ValueError('Survey CSV has no column for: ' +
+                             ', '.join(missing_required))
+
+def stream_survey(path, names=None, required=True):
+    """Read a longitudinal survey CSV export one row tuple at a time.
+
+    Returns the schema for the CSV header and a generator of rows.
+    Short rows are padded with empty answers."""
+    csvFile = open(path, 'r')
+    freader = csv.reader(csvFile, delimiter=';', quotechar='"')
+    fieldnames = next(freader)
+    try:
+        schema = surveySchema(fieldnames, names, required)
+    except ValueError as e:
+        csvFile.close()
+        sys.exit(path + ': ' + str(e))
+    width = len(fieldnames)
+    def rows():
+        with csvFile:
+            for row in freader:
+                if len(row) < width:
+                    row = row + [''] * (width - len(row))
+                yield tuple(row)
+    return schema, rows()
+
+def read_survey(path, names=None, required=True):
+    """Read a longitudinal survey CSV export into a list of row tuples.
+
+    Returns the schema for the CSV header and the list of rows."""
+    schema, rows = stream_survey(path, names, required)
+    return schema, list(rows)
+
+def normalize_email(email):
+    """Lowercase an email address and drop +tags, and dots in Gmail addresses,
+    so the different spellings alums use for one inbox compare equal."""
+    email = email.strip().lower()
+    user, at, domain = email.rpartition('@')
+    if not at:
+        return email
+    user = user.split('+', 1)[0]
+    if domain in ('gmail.com', 'googlemail.com'):
+        user = user.replace('.', '')
+        domain = 'gmail.com'
+    return user + '@' + domain
+
+def normalize_name(name):
+    """Strip accents, case, punctuation and word order from a name."""
+    name = unicodedata.normalize('NFKD', name)
+    name = ''.join(c for c in name if not unicodedata.combining(c))
+    return ' '.join(sorted(re.findall(r'\w+', name.casefold())))
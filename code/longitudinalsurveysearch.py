@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+#
+# Copyright 2020 Sage Sharp <sharp@otter.technology>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Search the free-text answers of longitudinal surveys for quotes.
+#
+# Add each year's survey export to the index once:
+# $ ./longitudinalsurveysearch.py --index quotes.json --add 2019-survey.csv --year 2019
+#
+# Then search all years at once. Results containing the exact phrase rank first:
+# $ ./longitudinalsurveysearch.py --index quotes.json first job
+# $ ./longitudinalsurveysearch.py --index quotes.json kubernetes
+
+import argparse
+import json
+import math
+import os
+import re
+from longitudinalsurveyresults import row_fingerprint, save_state
+from longitudinalsurveyschema import read_survey
+
+# Free-text survey questions (short names from longitudinalsurveyschema.py),
+# and the label to print with matching answers.
+free_text_columns = [
+    ('awards', 'Award'),
+    ('leadership_roles', 'Leadership role'),
+    ('success_story', 'Success story'),
+    ('before_situation', 'Before Outreachy'),
+    ('current_situation', 'Current situation'),
+]
+respondent_columns = ['first_name', 'last_name', 'email', 'round', 'community']
+
+def tokenize(text):
+    return re.findall(r"\w+(?:'\w+)?", text.lower())
+
+def load_index(path):
+    if not os.path.exists(path):
+        return {'documents': [], 'postings': {}}
+    with open(path, 'r') as indexFile:
+        return json.load(indexFile)
+
+def add_responses(index, csvpath, year):
+    # Documents are keyed by the response fingerprint and question,
+    # so adding the same export twice doesn't duplicate answers.
+    known = set(doc['key'] for doc in index['documents'])
+    added = 0
+    # Older surveys didn't ask every question, so missing columns are empty.
+    schema, data = read_survey(csvpath,
+                               respondent_columns + [column for column, label in free_text_columns],
+                               required=False)
+    for row in data:
+        fingerprint = row_fingerprint(row)
+        for column, label in free_text_columns:
+            text = getattr(schema, column)(row).strip()
+            key = fingerprint + ' ' + label
+            if not text or key in known:
+                continue
+            known.add(key)
+            terms = tokenize(text)
+            docid = len(index['documents'])
+            index['documents'].append({
+                'key': key,
+                'year': year,
+                'label': label,
+                'name': ' '.join(filter(None, [schema.first_name(row), schema.last_name(row)])),
+                'email': schema.email(row),
+                'round': schema.round(row),
+                'community': schema.community(row),
+                'text': text,
+                'length': len(terms),
+                })
+            positions = {}
+            for position, term in enumerate(terms):
+                positions.setdefault(term, []).append(position)
+            for term, p in positions.items():
+                index['postings'].setdefault(term, []).append([docid, p])
+            added += 1
+    return added
+
+def phrase_count(term_positions):
+    # term_positions is the list of positions of each query term in one document.
+    # Count the places where the terms appear one after another.
+    following = [set(positions) for positions in term_positions[1:]]
+    count = 0
+    for start in term_positions[0]:
+        if all(start + offset + 1 in positions for offset, positions in enumerate(following)):
+            count += 1
+    return count
+
+def search(index, query, limit):
+    terms = tokenize(query)
+    if not terms:
+        return []
+    postings = []
+    for term in terms:
+        if term not in index['postings']:
+            return []
+        postings.append(dict((docid, positions) for docid, positions in index['postings'][term]))
+
+    # Only documents containing every term can match. Start with the rarest term.
+    candidates = set(min(postings, key=len))
+    for p in postings:
+        candidates.intersection_update(p)
+
+    total_docs = len(index['documents'])
+    results = []
+    for docid in candidates:
+        doc = index['documents'][docid]
+        score = 0.0
+        for term, p in zip(terms, postings):
+            idf = math.log(1 + total_docs / len(p))
+            score += len(p[docid]) * idf / math.sqrt(max(doc['length'], 1))
+        phrases = phrase_count([p[docid] for p in postings]) if len(terms) > 1 else len(postings[0][docid])
+        results.append((phrases > 0, score * (1 + phrases), doc))
+    results.sort(key=lambda result: (result[0], result[1]), reverse=True)
+    return results[:limit]
+
+def main():
+    parser = argparse.ArgumentParser(description='Index and search free-text answers from Outreachy longitudinal surveys')
+    parser.add_argument('--index', help='JSON file to store the search index in', required=True)
+    parser.add_argument('--add', help='CSV file of longitudinal survey responses to add to the index')
+    parser.add_argument('--year', help='Year of the survey being added')
+    parser.add_argument('--limit', help='Maximum number of quotes to print', type=int, default=20)
+    parser.add_argument('query', nargs='*', help='words or phrase to search for')
+    args = parser.parse_args()
+
+    index = load_index(args.index)
+    if args.add:
+        added = add_responses(index, args.add, args.year or '')
+        save_state(args.index, index)
+        print('Added', added, 'answers from', args.add, 'to', args.index)
+
+    if args.query:
+        query = ' '.join(args.query)
+        for exact, score, doc in search(index, query, args.limit):
+            heading = '{} ({} {}, {} survey, {}) {}'.format(doc['name'], doc['round'], doc['community'], doc['year'], doc['email'], doc['label'])
+            if not exact:
+                heading = heading + ' [words found, but not as a phrase]'
+            print(heading + ':')
+            print(doc['text'])
+            print()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+#
+# Copyright 2020 Sage Sharp <sharp@otter.technology>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Check that extract-contents.py gives the same output whether it loads
+# the whole page into memory (filter_document) or streams it with ijson
+# (filter_stream), on pages that are much bigger or more deeply nested
+# than a real wiki page:
+#
+# $ ./check-extract-contents.py
+#
+# Pages exported by moin, as pandoc JSON, can be checked too:
+#
+# $ for f in html/*.html; do pandoc -t json -o "$(basename "$f" .html)".json "$f"; done
+# $ ./check-extract-contents.py *.json
+#
+# --write saves the generated pages, to time the filter on them with pandoc
+# or to compare them with an older version of the filter.
+
+import argparse
+import importlib.util
+import io
+import json
+import os
+import sys
+import threading
+
+def load_filter():
+    # extract-contents.py has a dash in its name, so it can't be imported
+    # the usual way.
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'extract-contents.py')
+    spec = importlib.util.spec_from_file_location('extract_contents', path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+extract = load_filter()
+
+# The pages are written as JSON text, since json.dumps can't write them
+# without recursing.
+api_version = '"pandoc-api-version":[1,23,1]'
+meta = ('"meta":{"title":{"t":"MetaInlines","c":[{"t":"Span","c":[["",["anchor"],[]],[]]},'
+        '{"t":"Str","c":"Title"}]}}')
+# A paragraph with everything remove_moin changes: an anchor, an external
+# link, and a link to a page that doesn't exist.
+para = ('{"t":"Para","c":[{"t":"Str","c":"Hello"},{"t":"Span","c":[["top",["anchor"],[]],[]]},'
+        '{"t":"Link","c":[["",["http"],[]],[{"t":"Str","c":"link"}],["http://example.com",""]]},'
+        '{"t":"Link","c":[["",["nonexistent"],[]],[{"t":"Emph","c":[{"t":"Str","c":"missing"}]}],["./Missing",""]]}]}')
+toc = '{"t":"Div","c":[["",["table-of-contents"],[]],[' + para + ']]}'
+
+def content(blocks):
+    return '{"t":"Div","c":[["content",[],[]],[' + blocks + ']]}'
+
+def divs(blocks, depth):
+    return '{"t":"Div","c":[["",[],[]],[' * depth + blocks + ']]}' * depth
+
+def block_quotes(blocks, depth):
+    return '{"t":"BlockQuote","c":[' * depth + blocks + ']}' * depth
+
+def emph(depth):
+    return '{"t":"Para","c":[' + '{"t":"Emph","c":[' * depth + '{"t":"Str","c":"deep"}' + ']}' * depth + ']}'
+
+def pages():
+    """Map of page name -> pandoc JSON text."""
+    blocks = {
+        'nested-divs': divs(content(para + ',' + toc), 3000),
+        'nested-block-quotes': content(block_quotes(para, 3000)),
+        'nested-emph': content(emph(5000)),
+        'many-blocks': content(','.join([para, toc] * 20000)),
+        'many-content-divs': ','.join(divs(content(para), 3) for i in range(2000)),
+        'no-content-div': para + ',' + toc + ',' + content(para),
+    }
+    return dict((name, '{' + api_version + ',' + meta + ',"blocks":[' + text + ']}')
+                for name, text in blocks.items())
+
+def in_memory(text):
+    out = io.StringIO()
+    extract.write_json(extract.filter_document(json.loads(text)), out)
+    return out.getvalue()
+
+def streamed(text):
+    out = io.StringIO()
+    extract.filter_stream(io.BytesIO(text.encode('utf-8')), out)
+    return out.getvalue()
+
+def check(name, text):
+    expected = in_memory(text)
+    got = streamed(text)
+    if got == expected:
+        print('ok', name)
+        return True
+    # Show where the output first differs.
+    at = next((i for i, (a, b) in enumerate(zip(expected, got)) if a != b), min(len(expected), len(got)))
+    print('MISMATCH', name, 'at character', at, file=sys.stderr)
+    print('  in memory:', expected[max(0, at - 40):at + 40], file=sys.stderr)
+    print('  streamed: ', got[max(0, at - 40):at + 40], file=sys.stderr)
+    return False
+
+def main():
+    parser = argparse.ArgumentParser(description='Check that extract-contents.py gives the same output in memory and streamed with ijson')
+    parser.add_argument('json', nargs='*', help='pandoc JSON files to check, instead of the generated pages')
+    parser.add_argument('--write', help='Directory to write the generated pages to, instead of checking them')
+    args = parser.parse_args()
+
+    if args.write:
+        if not os.path.exists(args.write):
+            os.makedirs(args.write)
+        for name, text in pages().items():
+            with open(os.path.join(args.write, name + '.json'), 'w') as pagefile:
+                pagefile.write(text)
+        return True
+
+    if extract.ijson is None:
+        # sys.exit wouldn't print this from the thread main runs in.
+        print('ijson is needed to check the streamed output', file=sys.stderr)
+        return False
+    if args.json:
+        checks = []
+        for path in args.json:
+            with open(path, 'r', encoding='utf-8') as jsonfile:
+                checks.append((path, jsonfile.read()))
+    else:
+        checks = pages().items()
+    # Not a generator expression, so every page is checked.
+    return all([check(name, text) for name, text in checks])
+
+if __name__ == "__main__":
+    # json.loads recurses into nested lists and objects, so the in-memory
+    # filter needs a bigger recursion limit and stack for the nested pages.
+    sys.setrecursionlimit(200000)
+    threading.stack_size(512 * 1024 * 1024)
+    result = []
+    thread = threading.Thread(target=lambda: result.append(main()))
+    thread.start()
+    thread.join()
+    sys.exit(0 if result and result[0] else 1)
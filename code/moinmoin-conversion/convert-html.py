@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+#
+# Copyright 2020 Sage Sharp <sharp@otter.technology>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Convert the HTML exported by MoinMoin to Markdown, like the shell loop
+# in NOTES does, with the same output:
+#
+#   for f in html/*.html; do pandoc --filter ./extract-contents.py -o "$(basename "$f" .html)".md "$f"; done
+#
+# That loop starts a Python interpreter for the filter on every page.
+# Here, the filter from extract-contents.py runs in this process, and the
+# pages are converted in parallel:
+#
+# $ ./convert-html.py html markdown
+#
+# Each page is read by pandoc into its JSON AST, filtered, and written back
+# out by pandoc. The output format comes from --ext, like pandoc -o does.
+# Like extract-contents.py, the AST is streamed through the filter with
+# ijson if it's installed, so deeply nested pages don't hit the recursion
+# limit. Without ijson, those pages are reported as errors.
+
+import argparse
+import importlib.util
+import io
+import json
+import os
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+def load_filter():
+    # extract-contents.py has a dash in its name, so it can't be imported
+    # the usual way.
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'extract-contents.py')
+    spec = importlib.util.spec_from_file_location('extract_contents', path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+extract = load_filter()
+
+def convert(pandoc, htmlfile, outfile):
+    """Convert one page. Returns None, or an error message."""
+    reader = subprocess.run([pandoc, '-t', 'json', htmlfile], capture_output=True)
+    if reader.returncode != 0:
+        return reader.stderr.decode('utf-8', 'replace').strip()
+    filtered = io.StringIO()
+    if extract.ijson is not None:
+        extract.filter_stream(io.BytesIO(reader.stdout), filtered)
+    else:
+        try:
+            doc = json.loads(reader.stdout.decode('utf-8'))
+        except RecursionError:
+            return 'too deeply nested to read without ijson'
+        extract.write_json(extract.filter_document(doc), filtered)
+    writer = subprocess.run([pandoc, '-f', 'json', '-o', outfile],
+                            input=filtered.getvalue().encode('utf-8'), capture_output=True)
+    if writer.returncode != 0:
+        return writer.stderr.decode('utf-8', 'replace').strip()
+    return None
+
+def main():
+    parser = argparse.ArgumentParser(description='Convert HTML exported from MoinMoin to Markdown with pandoc')
+    parser.add_argument('htmldir', help='Directory of .html files exported by moin export dump')
+    parser.add_argument('outdir', help='Directory to write the converted files to')
+    parser.add_argument('--ext', help='Extension of the converted files, which picks the pandoc output format', default='.md')
+    parser.add_argument('--jobs', help='Number of pages to convert at once', type=int, default=os.cpu_count())
+    parser.add_argument('--pandoc', help='pandoc program to run', default='pandoc')
+    args = parser.parse_args()
+
+    if not os.path.exists(args.outdir):
+        os.makedirs(args.outdir)
+
+    pages = sorted(f for f in os.listdir(args.htmldir) if f.endswith('.html'))
+    start = time.monotonic()
+    with ThreadPoolExecutor(max_workers=args.jobs) as executor:
+        errors = executor.map(lambda f: convert(args.pandoc,
+                                                os.path.join(args.htmldir, f),
+                                                os.path.join(args.outdir, f[:-len('.html')] + args.ext)),
+                              pages)
+        failed = 0
+        for f, error in zip(pages, errors):
+            if error is not None:
+                failed += 1
+                print('Could not convert', f + ':', error, file=sys.stderr)
+    elapsed = time.monotonic() - start
+    print('Converted {} pages in {:.1f} seconds'.format(len(pages) - failed, elapsed))
+
+if __name__ == "__main__":
+    main()
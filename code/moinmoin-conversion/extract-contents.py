@@ -15,18 +15,59 @@
 
 import codecs
 import json
-from pandocfilters import walk, Link
 import sys
+try:
+    import ijson
+except ImportError:
+    ijson = None
+
+# Both the Div nesting and the AST are walked with an explicit stack, not
+# recursion, so very deeply nested pages can't hit the recursion limit.
 
 def extract_contents(blocks):
-    for block in blocks:
-        if block["t"] == "Div":
-            if block["c"][0][0] == "content":
-                for child in block["c"][1]:
-                    yield child
-            else:
-                for result in extract_contents(block["c"][1]):
-                    yield result
+    stack = [iter(blocks)]
+    while stack:
+        for block in stack[-1]:
+            if block["t"] == "Div":
+                if block["c"][0][0] == "content":
+                    for child in block["c"][1]:
+                        yield child
+                else:
+                    stack.append(iter(block["c"][1]))
+                    break
+        else:
+            stack.pop()
+
+def walk(x, action, format, meta):
+    """Apply action to every object in x, like pandocfilters.walk, but
+    change the lists in place instead of building a new tree.
+    Objects an action returns are not passed to the action themselves,
+    but their contents are."""
+    stack = [x]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, dict):
+            stack.extend(v for v in node.values() if isinstance(v, (list, dict)))
+            continue
+        replaced = None
+        for index, item in enumerate(node):
+            if isinstance(item, dict) and 't' in item:
+                res = action(item['t'], item['c'] if 'c' in item else None, format, meta)
+                if res is not None and replaced is None:
+                    replaced = node[:index]
+                if replaced is not None:
+                    if res is None:
+                        replaced.append(item)
+                    elif isinstance(res, list):
+                        replaced.extend(res)
+                    else:
+                        replaced.append(res)
+            elif replaced is not None:
+                replaced.append(item)
+        if replaced is not None:
+            node[:] = replaced
+        stack.extend(item for item in node if isinstance(item, (list, dict)))
+    return x
 
 def remove_moin(key, value, format, meta):
     if key == "Span" and "anchor" in value[0][1]:
@@ -39,8 +80,135 @@ def remove_moin(key, value, format, meta):
         value[0][1] = [c for c in value[0][1] if c not in ("http", "https")]
         return {"t": key, "c": value}
 
-if __name__ == "__main__":
-    doc = json.load(codecs.getreader("utf-8")(sys.stdin))
+def filter_document(doc):
     doc["blocks"] = list(extract_contents(doc["blocks"]))
-    doc = walk(doc, remove_moin, "", {})
-    json.dump(doc, codecs.getwriter("utf-8")(sys.stdout))
+    return walk(doc, remove_moin, "", {})
+
+class raw(str):
+    pass
+
+def write_json(value, outfile):
+    """json.dump, without recursion."""
+    stack = [value]
+    while stack:
+        item = stack.pop()
+        if type(item) is raw:
+            outfile.write(item)
+        elif isinstance(item, dict):
+            stack.append(raw("}"))
+            items = list(item.items())
+            for index in reversed(range(len(items))):
+                key, child = items[index]
+                stack.append(child)
+                stack.append(raw((", " if index else "") + json.dumps(key) + ": "))
+            stack.append(raw("{"))
+        elif isinstance(item, list):
+            stack.append(raw("]"))
+            for index in reversed(range(len(item))):
+                stack.append(item[index])
+                if index:
+                    stack.append(raw(", "))
+            stack.append(raw("["))
+        else:
+            outfile.write(json.dumps(item))
+
+def build_value(event, value, events, builder=None, depth=0):
+    """Build the JSON value that starts with this ijson event."""
+    if builder is None:
+        builder = ijson.ObjectBuilder()
+    while True:
+        builder.event(event, value)
+        if event in ("start_map", "start_array"):
+            depth += 1
+        elif event in ("end_map", "end_array"):
+            depth -= 1
+        if depth == 0:
+            return builder.value
+        event, value = next(events)
+
+def stream_contents(events):
+    """extract_contents, over the ijson events just after the start of the
+    blocks array. The children of content Divs are built and yielded one
+    at a time; nothing else is kept."""
+    # Number of block lists we're inside of
+    depth = 1
+    while depth:
+        event, value = next(events)
+        if event == "end_array":
+            depth -= 1
+            if depth:
+                # The end of the Div's "c" list, and of the Div
+                next(events)
+                next(events)
+            continue
+        event, key = next(events)
+        if key != "t":
+            # Not laid out the way pandoc writes blocks; build the whole block.
+            builder = ijson.ObjectBuilder()
+            builder.event("start_map", None)
+            block = build_value(event, key, events, builder, 1)
+            for child in extract_contents([block]):
+                yield child
+            continue
+        event, blocktype = next(events)
+        event, value = next(events)
+        if event == "end_map":
+            continue
+        event, value = next(events)
+        if blocktype != "Div":
+            build_value(event, value, events)
+            next(events)
+            continue
+        event, value = next(events)
+        attr = build_value(event, value, events)
+        next(events)
+        if attr[0] != "content":
+            depth += 1
+            continue
+        while True:
+            event, value = next(events)
+            if event == "end_array":
+                next(events)
+                next(events)
+                break
+            yield build_value(event, value, events)
+
+def filter_stream(infile, outfile):
+    """Filter a pandoc JSON document while it's read, keeping only one
+    block of the page contents in memory at a time. Needs ijson."""
+    events = ijson.basic_parse(infile, use_float=True)
+    next(events)
+    outfile.write("{")
+    first = True
+    for event, key in events:
+        if event == "end_map":
+            break
+        if not first:
+            outfile.write(", ")
+        first = False
+        outfile.write(json.dumps(key) + ": ")
+        event, value = next(events)
+        if key != "blocks":
+            value = build_value(event, value, events)
+            write_json(walk(value, remove_moin, "", {}), outfile)
+            continue
+        outfile.write("[")
+        firstblock = True
+        for block in stream_contents(events):
+            for block in walk([block], remove_moin, "", {}):
+                if not firstblock:
+                    outfile.write(", ")
+                firstblock = False
+                write_json(block, outfile)
+        outfile.write("]")
+    outfile.write("}")
+
+if __name__ == "__main__":
+    stdin = getattr(sys.stdin, "buffer", sys.stdin)
+    stdout = codecs.getwriter("utf-8")(getattr(sys.stdout, "buffer", sys.stdout))
+    if ijson is not None:
+        filter_stream(stdin, stdout)
+    else:
+        doc = json.load(codecs.getreader("utf-8")(stdin))
+        doc = filter_document(doc)
+        write_json(doc, stdout)
@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+#
+# Copyright 2020 Sage Sharp <sharp@otter.technology>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# A contacts database shared by the mailer scripts.
+#
+# Each mailer script builds its recipients from a different CSV (Tapia
+# booth sign-ups, resumes, alums). When they're given the same
+# --contactsdb, every recipient is loaded into one sqlite file, indexed by
+# normalized email address and name, along with which campaign wrote or
+# sent them a draft. Recipients who already got an email from another
+# campaign in the same --round are skipped. A campaign that sends in stages
+# (like the longitudinal survey email and its reminders) records each
+# stage separately, so a later stage isn't skipped because of an earlier one:
+#
+# $ ./tapiaemail.py --contactsdb contacts.db --round 2020-05 tapia tapia.csv
+# $ ./genericemail.py --contactsdb contacts.db --round 2020-05 generic booth.csv
+#
+# Show everything sent to one person:
+# $ ./outreachcontacts.py contacts.db someone@example.com
+
+import argparse
+import email.utils
+import os
+import sqlite3
+import sys
+from longitudinalsurveyschema import normalize_email, normalize_name
+
+schema = '''
+CREATE TABLE IF NOT EXISTS contacts (
+    id INTEGER PRIMARY KEY,
+    email TEXT NOT NULL,
+    email_key TEXT NOT NULL UNIQUE,
+    name TEXT NOT NULL,
+    name_key TEXT NOT NULL,
+    source TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS contacts_name_key ON contacts (name_key);
+CREATE TABLE IF NOT EXISTS sends (
+    contact INTEGER NOT NULL REFERENCES contacts (id),
+    campaign TEXT NOT NULL,
+    stage TEXT NOT NULL DEFAULT '',
+    round TEXT NOT NULL,
+    state TEXT NOT NULL,
+    draft TEXT,
+    updated TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (contact, campaign, stage, round)
+);
+CREATE INDEX IF NOT EXISTS sends_round ON sends (contact, round);
+CREATE INDEX IF NOT EXISTS sends_draft ON sends (campaign, stage, round, draft);
+'''
+
+def add_contacts_arguments(parser):
+    """Add the options for the shared contacts database to a mailer script's parser."""
+    parser.add_argument('--contactsdb', help='sqlite file of contacts shared by the mailer scripts. Recipients who were already emailed by another campaign in this --round are skipped.')
+    parser.add_argument('--campaign', help='Name of this mailing in the contacts database (defaults to the script name)')
+    parser.add_argument('--round', help='Internship round this mailing is for, e.g. 2020-05', default='')
+
+def split_address(contact):
+    """Split '"Name" <email>' into (name, email)."""
+    name, address = email.utils.parseaddr(contact)
+    return name, address
+
+class contactStore:
+    """Contacts and the drafts written or sent to them, for one stage of a campaign.
+
+    A contact counts as already emailed this round if another campaign in
+    the round wrote them a draft or sent them email, or this stage of this
+    campaign sent them email. Other stages of this campaign don't count.
+    Drafts this stage wrote but didn't send can be regenerated."""
+    def __init__(self, path, campaign, round, stage=''):
+        self.db = sqlite3.connect(path)
+        self.db.executescript(schema)
+        self.campaign = campaign
+        self.stage = stage
+        self.round = round
+
+    def add(self, contacts, source):
+        """Bulk-load contact strings ('"Name" <email>') in one transaction.
+        Contacts whose email is already stored keep their first name and source."""
+        def rows():
+            for contact in contacts:
+                name, address = split_address(contact)
+                if address:
+                    yield (address, normalize_email(address), name, normalize_name(name), source)
+        with self.db:
+            self.db.executemany('INSERT INTO contacts (email, email_key, name, name_key, source) '
+                                'VALUES (?, ?, ?, ?, ?) ON CONFLICT (email_key) DO NOTHING', rows())
+
+    def contact_id(self, contact):
+        name, address = split_address(contact)
+        row = self.db.execute('SELECT id FROM contacts WHERE email_key = ?',
+                              (normalize_email(address),)).fetchone()
+        if row is None:
+            return None
+        return row[0]
+
+    def find_name(self, name):
+        """Contacts whose name matches, ignoring case, accents and word order."""
+        return self.db.execute('SELECT name, email FROM contacts WHERE name_key = ?',
+                               (normalize_name(name),)).fetchall()
+
+    def emailed(self, contact):
+        """Whether this contact was already emailed this round."""
+        contact_id = self.contact_id(contact)
+        if contact_id is None:
+            return False
+        row = self.db.execute('SELECT 1 FROM sends WHERE contact = ? AND round = ? '
+                              'AND (campaign != ? OR (stage = ? AND state = ?)) LIMIT 1',
+                              (contact_id, self.round, self.campaign, self.stage, 'sent')).fetchone()
+        return row is not None
+
+    def record(self, contact, state, draft=None):
+        # Not committed until the next send result or close(), so writing
+        # a batch of drafts is one transaction.
+        contact_id = self.contact_id(contact)
+        if contact_id is None:
+            return
+        self.db.execute('INSERT INTO sends (contact, campaign, stage, round, state, draft) VALUES (?, ?, ?, ?, ?, ?) '
+                        'ON CONFLICT (contact, campaign, stage, round) DO UPDATE SET '
+                        'state = excluded.state, '
+                        'draft = COALESCE(excluded.draft, draft), updated = CURRENT_TIMESTAMP',
+                        (contact_id, self.campaign, self.stage, self.round, state, draft))
+
+    def written(self, contact, draft):
+        """Record that a draft was written for contact."""
+        self.record(contact, 'written', draft)
+
+    def on_result(self, draft, result):
+        """send_drafts callback that records whether each draft was sent."""
+        self.db.execute('UPDATE sends SET state = ?, updated = CURRENT_TIMESTAMP '
+                        'WHERE campaign = ? AND stage = ? AND round = ? AND draft = ?',
+                        ('sent' if result == 'sent' else 'failed', self.campaign, self.stage, self.round, draft))
+        self.db.commit()
+
+    def history(self, address):
+        return self.db.execute('SELECT contacts.name, contacts.email, campaign, stage, round, state, draft, updated '
+                               'FROM sends JOIN contacts ON sends.contact = contacts.id '
+                               'WHERE contacts.email_key = ? ORDER BY updated',
+                               (normalize_email(address),)).fetchall()
+
+    def close(self):
+        self.db.commit()
+        self.db.close()
+
+def open_contacts(args, stage=''):
+    """Open the contacts database named by --contactsdb, or return None.
+    stage is set by scripts that send a campaign in several stages."""
+    if not args.contactsdb:
+        return None
+    campaign = args.campaign or os.path.basename(sys.argv[0])
+    return contactStore(args.contactsdb, campaign, args.round, stage)
+
+def main():
+    parser = argparse.ArgumentParser(description='Show the emails the Outreachy mailer scripts wrote or sent to someone')
+    parser.add_argument('contactsdb', help='sqlite contacts database written by the mailer scripts')
+    parser.add_argument('people', nargs='+', help='email addresses or names to look up')
+    args = parser.parse_args()
+
+    store = contactStore(args.contactsdb, '', '')
+    for person in args.people:
+        addresses = [person]
+        if '@' not in person:
+            addresses = [address for name, address in store.find_name(person)]
+        if not addresses:
+            print(person + ': not in the contacts database')
+        for address in addresses:
+            history = store.history(address)
+            if not history:
+                print(address + ': never emailed')
+            for name, address, campaign, stage, round, state, draft, updated in history:
+                if stage:
+                    campaign += ' ' + stage
+                print('"{}" <{}>: {} ({} round) {} {} {}'.format(name, address, campaign, round, state, draft or '', updated))
+    store.close()
+
+if __name__ == "__main__":
+    main()
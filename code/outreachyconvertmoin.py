@@ -26,6 +26,8 @@
 #   - attachments - file attachments - we should probably store these in a public git repository until we have Rackspace hosted storage
 #   - cache - safely ignore?
 #   - edit-log - ip addresses and what action they took - safely ignore
+#     (outreachymoinhistory.py uses it and the old revisions to export the
+#     history of every page to git)
 #
 #
 # Input:
@@ -42,100 +44,340 @@
 #    - print a warning if any directory in $PAGEDIR contains a directory
 #
 # Translate flat directory structure into actual directories - not sure if we need this??
+#
+# Each --copy run records the revision of each page and the size, mtime and
+# hash of each attachment in $WEBSITEDIR/.moin-sync.json. Rerunning --copy
+# into the same website directory only copies what changed, and removes
+# pages and attachments that are gone from the wiki.
 
 import argparse
 import os
 import re
 import collections
+import functools
+import hashlib
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
 from shutil import copyfile
+from outreachysearchindex import build_index
 
-def createdirectories(args):
-    files = os.listdir(args.wikidir)
-    attachments = []
+def copy_one(copy):
+    """Copy a (source, destination) pair. Returns the number of bytes
+    copied, or None if the source couldn't be copied."""
+    source, destination = copy
+    try:
+        copyfile(source, destination)
+    except OSError:
+        return None
+    return os.path.getsize(destination)
+
+def copy_hashed(copy):
+    """Copy a (source, destination) pair, hashing the contents as they're
+    copied. Returns (number of bytes, sha256 hex digest), or None if the
+    source couldn't be copied."""
+    source, destination = copy
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        with open(source, 'rb') as infile, open(destination, 'wb') as outfile:
+            while True:
+                chunk = infile.read(1024 * 1024)
+                if not chunk:
+                    break
+                digest.update(chunk)
+                outfile.write(chunk)
+                size += len(chunk)
+    except OSError:
+        return None
+    return size, digest.hexdigest()
+
+def link_or_copy(source, destination):
+    """Hardlink source to destination, or copy it if hardlinks aren't supported."""
+    if os.path.lexists(destination):
+        os.remove(destination)
+    try:
+        os.link(source, destination)
+    except OSError:
+        copyfile(source, destination)
+
+def copy_group(copy, group):
+    return [copy(pair) for pair in group]
+
+def copy_all(copies, jobs, copy=copy_one):
+    """Copy a list of (source, destination) pairs over a pool of threads.
+    Returns the result of copy for each pair, in order.
+
+    Copies to the same destination are done one after another, in order,
+    so the last one wins like it would if they were copied serially."""
+    groups = collections.OrderedDict()
+    for index, (source, destination) in enumerate(copies):
+        groups.setdefault(destination, []).append(index)
+    results = [None] * len(copies)
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        done = executor.map(functools.partial(copy_group, copy),
+                            [[copies[index] for index in group] for group in groups.values()])
+        for group, sizes in zip(groups.values(), done):
+            for index, size in zip(group, sizes):
+                results[index] = size
+    return results
+
+def print_throughput(what, results, start):
+    elapsed = max(time.monotonic() - start, 1e-6)
+    copied = [size for size in results if size is not None]
+    megabytes = sum(copied) / (1024 * 1024)
+    print('Copied {} {} ({:.1f} MB) in {:.2f} seconds: {:.0f} files/s, {:.1f} MB/s'.format(
+        len(copied), what, megabytes, elapsed, len(copied) / elapsed, megabytes / elapsed))
+
+def sync_manifest_path(websitedir):
+    return os.path.join(websitedir, '.moin-sync.json')
+
+def load_sync_manifest(websitedir):
+    """The page revisions and attachments copied by the last --copy run."""
+    path = sync_manifest_path(websitedir)
+    if not os.path.exists(path):
+        return {'pages': {}, 'attachments': {}}
+    with open(path, 'r') as manifestFile:
+        return json.load(manifestFile)
+
+def save_sync_manifest(websitedir, manifest):
+    path = sync_manifest_path(websitedir)
+    with open(path + '.tmp', 'w') as manifestFile:
+        json.dump(manifest, manifestFile, sort_keys=True)
+    os.replace(path + '.tmp', path)
+
+def read_current(pagedir):
+    """The revision number in a page's current file, or None if it has none.
+    Read with os.open, which is noticeably cheaper than open() when it's
+    done for every page of a big wiki."""
+    try:
+        fd = os.open(os.path.join(pagedir, 'current'), os.O_RDONLY)
+    except (FileNotFoundError, NotADirectoryError):
+        return None
+    try:
+        contents = os.read(fd, 4096)
+    except IsADirectoryError:
+        return None
+    finally:
+        os.close(fd)
+    return contents.decode('utf-8').split('\n', 1)[0]
+
+def walk_wiki(wikidir):
+    """Classify the directories of a wiki dump in one pass over it.
+
+    Uses os.scandir, so the file types come from the directory listing
+    instead of a stat call per path. Rather than checking whether each
+    page has a current file and an attachments directory first, they're
+    opened and a missing one is skipped. Returns the path of the current
+    revision of each page, the path of each attachment, the directories
+    with attachments but no current revision, and the directories with
+    neither (like anchor links)."""
     isapage = []
+    attachments = []
+    attachmentonly = []
     notapage = []
-    for f in files:
-        fdir = os.path.join(args.wikidir, f)
-        if not os.path.isdir(fdir):
-            continue
-        attachdir = os.path.join(fdir, "attachments")
-        if os.path.isdir(attachdir):
-            attachments.extend([os.path.join(attachdir, x) for x in os.listdir(attachdir)])
-        currevfile = os.path.join(fdir, "current")
-        if not os.path.isfile(currevfile):
-            if not os.path.isdir(attachdir):
-                notapage.append(fdir)
-            continue
-        with open(currevfile, 'r') as crf:
-            isapage.append(os.path.join(fdir, "revisions", crf.readline().strip('\n')))
+    with os.scandir(wikidir) as entries:
+        for entry in entries:
+            if not entry.is_dir():
+                continue
+            hasattachments = True
+            try:
+                with os.scandir(os.path.join(entry.path, 'attachments')) as afiles:
+                    attachments.extend([afile.path for afile in afiles])
+            except (FileNotFoundError, NotADirectoryError):
+                hasattachments = False
+            currev = read_current(entry.path)
+            if currev is None:
+                if hasattachments:
+                    attachmentonly.append(entry.path)
+                else:
+                    notapage.append(entry.path)
+                continue
+            isapage.append(os.path.join(entry.path, "revisions", currev))
+    return isapage, attachments, attachmentonly, notapage
+
+def createdirectories(args):
+    isapage, attachments, attachmentonly, notapage = walk_wiki(args.wikidir)
     print('Number of pages with a current revision', len(isapage))
     print('\nNumber of attachments', len(attachments))
+    print('\nNumber of directories with attachments but no current revision', len(attachmentonly))
     print('\nNumber of directories without attachments or a current revision', len(notapage))
 
+    # Pages and attachments that haven't changed since the last --copy run
+    # into websitedir aren't copied again.
+    manifest = load_sync_manifest(args.websitedir)
+    pages = {}
+    attachmentstate = {}
+
     # create a list of path directories by splitting the flat directory name on (2f)
     # remove the last three elements from that path (PAGENAME/revisions/CURREV)
     # create a new directory path from that list, 
     # use os.mkdirs(path) to create all directories for that file (in a try-catch block)
+    # The directories are made first, then the revisions are copied in parallel.
+    copies = []
+    unchanged = 0
+    made = set()
     for currevfile in isapage:
         # PAGENAME/revisions/CURREV
         basedir = os.path.split(os.path.dirname(os.path.dirname(currevfile)))[1]
+        page = basedir
         paths = basedir.split('(2f)')
         moin = paths[-1] + '.moin'
         paths = paths[:-1]
         paths.append(moin)
         if len(paths) > 1:
             basedir = os.path.join(args.websitedir, *(paths[:-1]))
-            try:
-                os.makedirs(basedir)
-            except:
-                pass
+            if basedir not in made:
+                made.add(basedir)
+                try:
+                    os.makedirs(basedir)
+                except:
+                    pass
         else:
             basedir = args.websitedir
-        try:
-            copyfile(currevfile, os.path.join(basedir, moin))
-        except:
+        pages[page] = {'revision': os.path.basename(currevfile), 'output': os.path.join(*paths)}
+        if manifest['pages'].get(page) == pages[page] and os.path.exists(os.path.join(basedir, moin)):
+            unchanged += 1
+            continue
+        copies.append((currevfile, os.path.join(basedir, moin)))
+    start = time.monotonic()
+    results = copy_all(copies, args.jobs)
+    for (currevfile, destination), size in zip(copies, results):
+        if size is None:
             print('Missing revision!', currevfile)
+            del pages[os.path.split(os.path.dirname(os.path.dirname(currevfile)))[1]]
+    print_throughput('revisions', results, start)
+    if unchanged:
+        print(unchanged, 'pages were at the same revision as the last copy')
+    removed = 0
+    outputs = set(entry['output'] for entry in pages.values())
+    for page, entry in manifest['pages'].items():
+        if page not in pages and entry['output'] not in outputs:
+            output = os.path.join(args.websitedir, entry['output'])
+            if os.path.exists(output):
+                os.remove(output)
+                removed += 1
+    if removed:
+        print('Removed', removed, 'pages that are no longer in the wiki')
 
     # Copy all attachments into one folder,
-    # creating a list of where they were linked from
+    # creating a list of where they were linked from.
+    # Each attachment is hashed as it's copied. Attachments with the same
+    # contents are only stored once, and hardlinked under any other names
+    # they have. Attachments with the same name as a different file get the
+    # start of their hash added to their name.
+    # Attachments with the same size and modification time as the last
+    # copy keep the hash recorded then, and aren't read again.
+    # They're sorted by page path, so the same attachment keeps the plain
+    # name on every run, whatever order the directories are listed in.
+    # outreachyfixmarkdown.py reads attachment-link-map.txt to link to the
+    # renamed ones.
+    # PAGENAME/attachments/a
+    attachments = sorted(attachments, key=lambda afile: (
+        os.path.split(os.path.dirname(os.path.dirname(afile)))[1].split('(2f)'), os.path.split(afile)[1]))
     adir = os.path.join(args.websitedir, 'attachments')
     try:
         os.mkdir(adir)
     except:
         pass
-    attachmentnames = []
+    copies = []
+    known = {}
+    stats = {}
+    for index, afile in enumerate(attachments):
+        try:
+            stat = stats[index] = os.stat(afile)
+        except OSError:
+            stat = None
+        entry = manifest['attachments'].get(os.path.relpath(afile, args.wikidir))
+        if stat and entry and entry['size'] == stat.st_size and entry['mtime'] == stat.st_mtime_ns:
+            known[index] = entry
+        else:
+            copies.append((afile, os.path.join(adir, '.copying-' + str(index))))
+    start = time.monotonic()
+    copied = copy_all(copies, args.jobs, copy_hashed)
+    print_throughput('attachments', [result and result[0] for result in copied], start)
+    if known:
+        print(len(known), 'attachments were unchanged since the last copy')
+    results = dict((int(tmpfile.rsplit('-', 1)[1]), (tmpfile, result)) for (afile, tmpfile), result in zip(copies, copied))
+    stored = {}
+    names = {}
+    renamed = []
+    linked = 0
     with open(os.path.join(adir, 'attachment-link-map.txt'), 'w') as linkmap:
-        for afile in attachments:
+        for index, afile in enumerate(attachments):
+            if index in known:
+                tmpfile = None
+                size, digest = known[index]['size'], known[index]['sha256']
+            else:
+                tmpfile, result = results[index]
+                if result is None:
+                    print('Missing attachment!', afile)
+                    continue
+                size, digest = result
             # PAGENAME/attachments/a
             basedir = os.path.split(os.path.dirname(os.path.dirname(afile)))[1]
             paths = basedir.split('(2f)')
             aname = os.path.split(afile)[1]
-            attachmentnames.append(aname)
-            linkmap.write(aname + '\t' + os.path.join(*paths, aname) + '\n')
-            try:
-                copyfile(afile, os.path.join(adir, aname))
-            except:
-                print('Missing attachment!', afile)
-    # If there is already a file with the same name, warn for now and don't overwrite.
-    # In the future, we should choose a unique new name.
-    # But I don't care, because my three duplicate files are all copies of each other.
-    duplicates = [item for item, count in collections.Counter(attachmentnames).items() if count > 1]
-    if duplicates:
-        print('Warning, attachments with duplicate names!')
-        print(duplicates)
+            if aname in names and names[aname] != digest:
+                root, ext = os.path.splitext(aname)
+                renamed.append((os.path.join(*paths, aname), root + '-' + digest[:8] + ext))
+                aname = renamed[-1][1]
+            final = os.path.join(adir, aname)
+            if aname in names:
+                pass
+            elif digest in stored:
+                if not (os.path.exists(final) and os.path.samefile(os.path.join(adir, stored[digest]), final)):
+                    link_or_copy(os.path.join(adir, stored[digest]), final)
+                linked += 1
+            elif tmpfile is not None:
+                os.replace(tmpfile, final)
+                stored[digest] = aname
+            else:
+                # Unchanged, but only re-copied if it isn't already stored under this name.
+                # Unlink first, so other names hardlinked to the old file keep their contents.
+                if known[index]['name'] != aname or not os.path.exists(final):
+                    if os.path.lexists(final):
+                        os.remove(final)
+                    copyfile(afile, final)
+                stored[digest] = aname
+            if tmpfile is not None and os.path.exists(tmpfile):
+                os.remove(tmpfile)
+            names[aname] = digest
+            attachmentstate[os.path.relpath(afile, args.wikidir)] = {
+                    'size': size, 'mtime': stats[index].st_mtime_ns, 'sha256': digest, 'name': aname}
+            linkmap.write(aname + '\t' + os.path.join(*paths, os.path.split(afile)[1]) + '\n')
+    print('Stored', len(stored), 'unique attachments, and hardlinked', linked, 'identical attachments with other names')
+    if renamed:
+        print('Renamed attachments with the same name as a different file:')
+        for link, aname in renamed:
+            print(' ', link, '->', aname)
+    removed = 0
+    for entry in manifest['attachments'].values():
+        if entry['name'] not in names and os.path.exists(os.path.join(adir, entry['name'])):
+            os.remove(os.path.join(adir, entry['name']))
+            removed += 1
+    if removed:
+        print('Removed', removed, 'attachments that are no longer in the wiki')
+    save_sync_manifest(args.websitedir, {'pages': pages, 'attachments': attachmentstate})
 
 # This assumes the moinmoin files have been copied into a directory structure
 def copymarkdown(args):
-    files = os.listdir(args.markdowndir)
-    for f in files:
-        tocopy = os.path.join(args.markdowndir, f)
-        if not os.path.isfile(tocopy) or not f.endswith('.md'):
+    with os.scandir(args.markdowndir) as entries:
+        files = list(entries)
+    # Many pages share a directory, so only check each one once.
+    directories = {}
+    for entry in files:
+        f = entry.name
+        tocopy = entry.path
+        if not entry.is_file() or not f.endswith('.md'):
             print('Bad markdown file:', tocopy)
             continue
         paths = f.split('(2f)')
         mddir = os.path.join(args.websitedir, *paths[:-1])
         destination = os.path.join(mddir, paths[-1])
-        if not os.path.isdir(mddir):
+        if mddir not in directories:
+            directories[mddir] = os.path.isdir(mddir)
+        if not directories[mddir]:
             print('Directory', mddir, 'for markdown file', f, 'does not exist')
         try:
             copyfile(tocopy, destination)
@@ -147,7 +389,9 @@ def main():
     parser.add_argument('wikidir', help='Directory with moinmoin files')
     parser.add_argument('websitedir', help='Directory to put converted files')
     parser.add_argument('--copy', help='Copy the current revision of each file from the moinmoin directory into the website directory', default=False)
+    parser.add_argument('--jobs', help='Number of files to copy at once', type=int, default=8)
     parser.add_argument('--markdowndir', help='Copy the translated markdown of each moinmoin file in MARKDOWNDIR into the right website directory', default=None)
+    parser.add_argument('--searchindex', help='Update the search index in the website directory after copying the markdown (see outreachysearchindex.py)', action='store_true')
     #parser.add_argument('matches', help='file to write potential matches to')
     args = parser.parse_args()
     print('Wiki dir:', args.wikidir)
@@ -156,6 +400,9 @@ def main():
         createdirectories(args)
     if args.markdowndir:
         copymarkdown(args)
+    if args.searchindex:
+        indexed, removed, written = build_index(args.websitedir, jobs=args.jobs)
+        print('Search index: indexed', indexed, 'changed pages, removed', removed, 'pages, and wrote', written, 'shards')
 
 if __name__ == "__main__":
     main()
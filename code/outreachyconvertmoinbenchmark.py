@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+#
+# Copyright 2020 Sage Sharp <sharp@otter.technology>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Time the walk over a MoinMoin wiki dump that outreachyconvertmoin.py does,
+# on a synthetic dump the size of a big wiki.
+#
+# Build a 100,000 page dump in /tmp/fakewiki (kept for later runs) and time
+# the os.scandir walker against the old os.listdir + isdir/isfile walk:
+# $ ./outreachyconvertmoinbenchmark.py --dump /tmp/fakewiki
+#
+# The first walk after building the dump runs with a warm cache. To time a
+# cold walk, drop the page cache (as root) between runs:
+# $ sync; echo 3 > /proc/sys/vm/drop_caches
+
+import argparse
+import os
+import random
+import shutil
+import tempfile
+import time
+from outreachyconvertmoin import walk_wiki
+
+def listdir_walk(wikidir):
+    """The walk outreachyconvertmoin.py used to do, kept to compare against."""
+    files = os.listdir(wikidir)
+    attachments = []
+    isapage = []
+    notapage = []
+    for f in files:
+        fdir = os.path.join(wikidir, f)
+        if not os.path.isdir(fdir):
+            continue
+        attachdir = os.path.join(fdir, "attachments")
+        if os.path.isdir(attachdir):
+            attachments.extend([os.path.join(attachdir, x) for x in os.listdir(attachdir)])
+        currevfile = os.path.join(fdir, "current")
+        if not os.path.isfile(currevfile):
+            if not os.path.isdir(attachdir):
+                notapage.append(fdir)
+            continue
+        with open(currevfile, 'r') as crf:
+            isapage.append(os.path.join(fdir, "revisions", crf.readline().strip('\n')))
+    return isapage, attachments, notapage
+
+def make_dump(wikidir, pages, seed):
+    """Write a fake wiki dump. Most directories are pages with a few
+    revisions; some also have attachments, some only have attachments,
+    and some are empty anchor link directories."""
+    rng = random.Random(seed)
+    words = ['Outreachy', 'Mentors', 'Apply', 'Eligibility', 'Sponsors', 'Projects', 'Round']
+    os.makedirs(wikidir)
+    for page in range(pages):
+        name = '(2f)'.join(rng.choice(words) for i in range(rng.randint(1, 3))) + str(page)
+        pagedir = os.path.join(wikidir, name)
+        os.mkdir(pagedir)
+        kind = rng.random()
+        if kind < 0.03:
+            continue
+        if kind < 0.95:
+            os.mkdir(os.path.join(pagedir, 'revisions'))
+            revisions = rng.randint(1, 3)
+            for revision in range(1, revisions + 1):
+                with open(os.path.join(pagedir, 'revisions', '%08d' % revision), 'w') as revfile:
+                    revfile.write('= ' + name + ' =\n')
+            with open(os.path.join(pagedir, 'current'), 'w') as current:
+                current.write('%08d\n' % revisions)
+            with open(os.path.join(pagedir, 'edit-log'), 'w') as editlog:
+                editlog.write('')
+            os.mkdir(os.path.join(pagedir, 'cache'))
+        if kind >= 0.8:
+            os.mkdir(os.path.join(pagedir, 'attachments'))
+            for attachment in range(rng.randint(1, 3)):
+                with open(os.path.join(pagedir, 'attachments', 'file%d.png' % attachment), 'w') as afile:
+                    afile.write('png')
+
+def time_walk(walk, wikidir, repeat):
+    best = None
+    for i in range(repeat):
+        start = time.perf_counter()
+        result = walk(wikidir)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark walking a synthetic MoinMoin wiki dump')
+    parser.add_argument('--pages', help='Number of page directories in the dump', type=int, default=100000)
+    parser.add_argument('--dump', help='Directory to build the dump in, or reuse if it exists. Defaults to a temporary directory that is removed afterwards.')
+    parser.add_argument('--repeat', help='Time each walk this many times and report the fastest', type=int, default=3)
+    parser.add_argument('--seed', help='Random seed for the dump', type=int, default=1)
+    args = parser.parse_args()
+
+    tmpdir = None
+    wikidir = args.dump
+    if not wikidir:
+        tmpdir = tempfile.mkdtemp()
+        wikidir = os.path.join(tmpdir, 'wiki')
+    if not os.path.exists(wikidir):
+        start = time.perf_counter()
+        make_dump(wikidir, args.pages, args.seed)
+        print('Built a dump of {} pages in {:.1f} seconds'.format(args.pages, time.perf_counter() - start))
+
+    try:
+        old, (isapage, attachments, notapage) = time_walk(listdir_walk, wikidir, args.repeat)
+        new, (newpages, newattachments, attachmentonly, newnotapage) = time_walk(walk_wiki, wikidir, args.repeat)
+        if newpages != isapage or newattachments != attachments or newnotapage != notapage:
+            print('Warning: the two walks found different pages!')
+        print('Pages: {}, attachments: {}, directories without a current revision: {}'.format(
+            len(isapage), len(attachments), len(notapage)))
+        print('os.listdir walk: {:.3f} seconds'.format(old))
+        print('os.scandir walk: {:.3f} seconds ({:.1f}x faster)'.format(new, old / new))
+    finally:
+        if tmpdir:
+            shutil.rmtree(tmpdir)
+
+if __name__ == "__main__":
+    main()
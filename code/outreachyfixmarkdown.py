@@ -18,46 +18,146 @@
 # This script modified markdown from converted moinmoin.
 # This fixes the moinmoin that was converted to markdown to point to
 # files in a directory structure, rather than the flat moin structure.
+#
+# All the link fixes are done in one scan over each file, by one pattern
+# that matches any of the links and a function that rewrites the match.
+# Files are fixed in parallel, and each is replaced atomically, so an
+# interrupted run never leaves a half-written page.
+#
+# Attachment links are rewritten to the names outreachyconvertmoin.py
+# stored the attachments under, from BASE/attachments/attachment-link-map.txt.
+#
+# See what would change without writing anything:
+# $ ./outreachyfixmarkdown.py --check . $(find . -name '*.md')
 
 import argparse
+import difflib
+import functools
 import os
 import re
+import shutil
+import sys
+import tempfile
+import urllib.parse
+from concurrent.futures import ProcessPoolExecutor
+
+# One alternative per kind of link, tried in this order at each position.
+# The lookahead skips quickly over text that can't start any of them.
+# Page names can contain MoinMoin's escapes like (2f) for /, so those are
+# allowed inside a page link even though other parentheses aren't.
+link_pattern = re.compile(r'''(?=[(\x20"{])(?:
+    \(\./Outreach(?P<page>(?:\([0-9a-f]{2}\)|[^()\s\#])*)\.(?:html|md)(?P<pageend>[)\#])
+  | \(\./index\.md(?P<indexend>[)\#])
+  | \(attachments(?P<attachment>\S*/\S*)\x20
+  | (?P<attribute>\{\.attachment.*?\})
+  | (?P<macro>[\x20"]+\{\{attachment.*?\}\}[\x20"]+)
+  | (?P<escape>\(2f\))
+)''', re.VERBOSE | re.DOTALL)
+
+@functools.lru_cache(maxsize=None)
+def base_prefix(base, directory):
+    """The path back to the base directory from a directory of pages, so
+    links can be made relative to the page they're in."""
+    return os.path.relpath(base, directory) + os.path.sep
+
+@functools.lru_cache(maxsize=None)
+def load_link_map(base):
+    """Map of PAGE/PATH/attachment -> the name outreachyconvertmoin.py
+    stored it under. Attachments with the same name as a different file
+    were renamed, so the name in the link isn't always the stored name."""
+    linkmap = {}
+    try:
+        mapfile = open(os.path.join(base, 'attachments', 'attachment-link-map.txt'), 'r')
+    except FileNotFoundError:
+        return linkmap
+    with mapfile:
+        for line in mapfile:
+            aname, sep, link = line.rstrip('\n').partition('\t')
+            if sep:
+                linkmap[link.replace(os.path.sep, '/')] = aname
+    return linkmap
+
+def fix_links(contents, prefix, linkmap={}):
+    def replace(match):
+        kind = match.lastgroup
+        if kind == 'pageend':
+            # Note that if you're using Jekyll, you'll need the jekyll-relative-links gem
+            # so that the relative markdown file links show up correctly.
+            # Links to Outreachy.html are links to index.md.
+            page = match.group('page').replace('(2f)', '/')
+            if page == 'y':
+                return '(' + prefix + 'index.md' + match.group('pageend')
+            return '(' + prefix + 'Outreach' + page + '.md' + match.group('pageend')
+        if kind == 'indexend':
+            return '(' + prefix + 'index.md' + match.group('indexend')
+        if kind == 'attachment':
+            # Attachments are all in one directory, so drop the page path.
+            path = match.group('attachment').replace('(2f)', '/')
+            name = path[path.rindex('/') + 1:]
+            link = path.lstrip('/')
+            aname = linkmap.get(link, linkmap.get(urllib.parse.unquote(link)))
+            if aname is not None and aname != urllib.parse.unquote(name):
+                name = urllib.parse.quote(aname)
+            return '(' + prefix + 'attachments/' + name + ' '
+        if kind == 'escape':
+            return '/'
+        return ''
+    return link_pattern.sub(replace, contents)
+
+def fix_file(base, path, check):
+    """Fix the links in one file. Returns the unified diff of the changes
+    if check is set, otherwise whether the file was changed."""
+    # Outreachy links need to be relative to the directory the .md page is in.
+    # e.g.
+    # if base directory is . and we're in directory Outreachy,
+    # and the link is currently (./Outreachy/History.md),
+    # it will get changed to (./History.md)
+    directory = os.path.dirname(os.path.realpath(path))
+    with open(path, 'r') as f:
+        contents = f.read()
+    fixed = fix_links(contents, base_prefix(base, directory), load_link_map(base))
+    if check:
+        return ''.join(difflib.unified_diff(contents.splitlines(keepends=True),
+                                            fixed.splitlines(keepends=True),
+                                            path, path))
+    if fixed == contents:
+        return False
+    with tempfile.NamedTemporaryFile('w', dir=directory, delete=False) as tmpfile:
+        tmpfile.write(fixed)
+    shutil.copymode(path, tmpfile.name)
+    os.replace(tmpfile.name, path)
+    return True
 
 def main():
     parser = argparse.ArgumentParser(description='Fix flat links to directory structures in moinmoin to markdown converted files.')
     parser.add_argument('base', help='base directory for relative links')
-    parser.add_argument('file', type=argparse.FileType('r+'), nargs='+', help='one or more files to convert')
+    parser.add_argument('file', nargs='+', help='one or more files to convert')
+    parser.add_argument('--check', help='Show the changes that would be made as a diff, without changing any files. Exits with status 1 if any file would change.', action='store_true')
+    parser.add_argument('--jobs', help='Number of files to fix at once', type=int, default=os.cpu_count())
     args = parser.parse_args()
-    for f in args.file:
-        print("Fixing file", f.name)
-        contents = re.sub(r'\(2f\)', '/', f.read())
-        # Note that if you're using Jekyll, you'll need the jekyll-relative-links gem
-        # so that the relative markdown file links show up correctly.
-        # FYI - this regex also handles anchors in relative links
-        contents = re.sub(r'\(\.\/Outreach(.*)\.html([\)#])', r'(./Outreach\1.md\2', contents)
-        # Fix all links to Outreachy.md => index.md (or relative, depending on the page)
-        contents = re.sub(r'\(\.\/Outreachy\.md', r'(./index.md', contents)
-
-        # Outreachy links need to be relative to the directory the .md page is in.
-        # This script finds all .md files in a directory,
-        # computes the path back to the base directory relative to this one,
-        # and replaces all directory prefixes with that path.
-        # e.g.
-        # if base directory is . and we're in directory Outreachy,
-        # and the link is currently (./Outreachy/History.md),
-        # it will get changed to (./History.md)
-        fpath = os.path.realpath(f.name)
-        relpath = '(' + os.path.relpath(args.base, os.path.dirname(fpath)) + os.path.sep + r'Outreach\1.md\2'
-        contents = re.sub(r'\(\.\/Outreach(.*)\.md([\)#])', relpath, contents)
-        relindexpath = '(' + os.path.relpath(args.base, os.path.dirname(fpath)) + os.path.sep + r'index.md\1'
-        contents = re.sub(r'\(\.\/index.md([\)#])', relindexpath, contents)
-        relattpath = '(' + os.path.relpath(args.base, os.path.dirname(fpath)) + os.path.sep + r'attachments\1'
-        contents = re.sub(r'\(attachments.*(\/.*) ', relattpath, contents)
-        contents = re.sub(r'\{\.attachment.*?\}', '', contents, flags=re.MULTILINE|re.DOTALL)
-        contents = re.sub(r'[ "]+\{\{attachment.*?\}\}[ "]+', '', contents, flags=re.MULTILINE|re.DOTALL)
-        f.seek(0)
-        f.write(contents)
-        f.truncate()
+
+    if args.jobs > 1:
+        executor = ProcessPoolExecutor(max_workers=args.jobs)
+        results = executor.map(fix_file, [args.base] * len(args.file), args.file,
+                               [args.check] * len(args.file),
+                               chunksize=max(1, len(args.file) // (args.jobs * 4)))
+    else:
+        executor = None
+        results = (fix_file(args.base, path, args.check) for path in args.file)
+    changed = 0
+    for path, result in zip(args.file, results):
+        if args.check:
+            sys.stdout.write(result)
+        else:
+            print("Fixing file", path)
+        if result:
+            changed += 1
+    if executor:
+        executor.shutdown()
+    if args.check:
+        print(changed, 'of', len(args.file), 'files would be changed', file=sys.stderr)
+        if changed:
+            sys.exit(1)
 
 if __name__ == "__main__":
     main()
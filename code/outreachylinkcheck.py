@@ -0,0 +1,317 @@
+#!/usr/bin/env python3
+#
+# Copyright 2020 Sage Sharp <sharp@otter.technology>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Check the links in the website, without a web server.
+#
+# Every .md and .html file under the site directory is parsed (in
+# parallel), and every file and heading anchor in the site is put in an
+# index. Each relative link is then looked up in the index, so the
+# Markdown written by outreachyfixmarkdown.py can be checked before it's
+# published:
+#
+# $ ./outreachylinkcheck.py website
+#
+# Only check some pages, against the whole site:
+# $ ./outreachylinkcheck.py website website/Outreachy/Apply.md
+#
+# External links are only checked with --external. Each URL is requested
+# once, over a limited number of connections at a time.
+#
+# Directories starting with . or _ are skipped, like Jekyll does.
+
+import argparse
+import asyncio
+import bisect
+import html.parser
+import os
+import re
+import ssl
+import sys
+import urllib.parse
+from concurrent.futures import ProcessPoolExecutor
+
+pages = ('.md', '.html', '.htm')
+index_pages = ('index.md', 'index.html', 'index.htm')
+ignored_schemes = ('mailto', 'tel', 'irc', 'ftp', 'javascript', 'data')
+
+# Fenced code blocks and inline code aren't links.
+code_pattern = re.compile(r'^ {0,3}(`{3,}|~{3,}).*?^ {0,3}\1[`~]*[ \t]*$|`[^`\n]+`', re.MULTILINE | re.DOTALL)
+markdown_link_pattern = re.compile(r'''
+    \]\(\s*(?:<(?P<angled>[^>\n]*)>|(?P<target>(?:[^\s()]|\([^\s()]*\))+))(?:\s+(?:"[^"]*"|'[^']*'))?\s*\)
+  | ^\x20{0,3}\[[^\]\n]+\]:\s*<?(?P<reference>[^\s>]+)
+  | <(?P<autolink>https?://[^>\s]+)>
+  | \b(?:href|src)\s*=\s*(?:"(?P<double>[^"]*)"|'(?P<single>[^']*)')
+''', re.MULTILINE | re.VERBOSE)
+heading_pattern = re.compile(r'^\x20{0,3}\#{1,6}[ \t]+(?P<atx>.*?)(?:[ \t]+\#+)?[ \t]*$'
+                             r'|^(?P<setext>[^\n]*\S[^\n]*)\n\x20{0,3}(?:=+|-+)[ \t]*$', re.MULTILINE)
+attribute_id_pattern = re.compile(r'\{[^}\n]*#(?P<id>[\w:.-]+)[^}\n]*\}')
+html_id_pattern = re.compile(r'\b(?:id|name)\s*=\s*(?:"([^"]*)"|\'([^\']*)\')')
+
+def kramdown_slug(heading):
+    """The id Jekyll's kramdown gives a heading."""
+    slug = re.sub(r'^[^a-zA-Z]+', '', heading)
+    slug = re.sub(r'[^a-zA-Z0-9 -]', '', slug)
+    return slug.replace(' ', '-').lower()
+
+def github_slug(heading):
+    """The id GitHub gives a heading when it shows the Markdown."""
+    return re.sub(r'[^\w -]', '', heading.lower()).replace(' ', '-')
+
+def heading_text(heading):
+    # Drop emphasis, links and attributes, keeping the text people see.
+    heading = attribute_id_pattern.sub('', heading)
+    heading = re.sub(r'!?\[([^\]]*)\]\([^)]*\)', r'\1', heading)
+    return re.sub(r'[*_`]', '', heading).strip()
+
+def line_starts(text):
+    return [0] + [match.end() for match in re.finditer('\n', text)]
+
+def blank_code(match):
+    # Keep the newlines, so line numbers after the code stay right.
+    return re.sub(r'[^\n]', ' ', match.group(0))
+
+def parse_markdown(text):
+    """Returns the (line, target) links and the set of anchors in a Markdown page."""
+    text = code_pattern.sub(blank_code, text)
+    starts = line_starts(text)
+    links = []
+    for match in markdown_link_pattern.finditer(text):
+        target = next(value for value in match.groups() if value is not None)
+        links.append((bisect.bisect(starts, match.start()), target))
+    anchors = set()
+    seen = {}
+    for match in heading_pattern.finditer(text):
+        heading = match.group('atx') if match.group('atx') is not None else match.group('setext')
+        explicit = attribute_id_pattern.search(heading)
+        if explicit:
+            anchors.add(explicit.group('id'))
+        heading = heading_text(heading)
+        for slug in set((kramdown_slug(heading), github_slug(heading))):
+            # Repeated headings get -1, -2, ... added to their ids.
+            count = seen.get(slug, 0)
+            seen[slug] = count + 1
+            anchors.add(slug if count == 0 else slug + '-' + str(count))
+    anchors.update(match.group('id') for match in attribute_id_pattern.finditer(text))
+    anchors.update(a or b for a, b in html_id_pattern.findall(text))
+    return links, anchors
+
+class htmlLinkParser(html.parser.HTMLParser):
+    def __init__(self):
+        super().__init__()
+        self.links = []
+        self.anchors = set()
+
+    def handle_starttag(self, tag, attrs):
+        for name, value in attrs:
+            if value is None:
+                continue
+            if name in ('href', 'src'):
+                self.links.append((self.getpos()[0], value))
+            elif name == 'id' or (name == 'name' and tag == 'a'):
+                self.anchors.add(value)
+
+def parse_html(text):
+    """Returns the (line, target) links and the set of anchors in an HTML page."""
+    parser = htmlLinkParser()
+    parser.feed(text)
+    parser.close()
+    return parser.links, parser.anchors
+
+def parse_page(path):
+    with open(path, 'r', encoding='utf-8', errors='replace') as page:
+        text = page.read()
+    if path.endswith('.md'):
+        return parse_markdown(text)
+    return parse_html(text)
+
+def walk_site(site):
+    """All the files and directories in the site, as paths relative to it."""
+    files = set()
+    directories = set([''])
+    for dirpath, dirnames, filenames in os.walk(site):
+        dirnames[:] = [d for d in dirnames if not d.startswith(('.', '_'))]
+        reldir = os.path.relpath(dirpath, site)
+        reldir = '' if reldir == '.' else reldir
+        directories.update(os.path.join(reldir, d) for d in dirnames)
+        files.update(os.path.join(reldir, f) for f in filenames)
+    return files, directories
+
+class siteIndex:
+    """The files in a site and the anchors in its pages, for looking up links."""
+    def __init__(self, files, directories, anchors):
+        self.files = files
+        self.directories = directories
+        self.anchors = anchors
+
+    def target(self, path):
+        """The file a site path refers to, or None. Directories refer to
+        their index page, and Jekyll turns foo.md into foo.html."""
+        if path in self.files:
+            return path
+        if path in self.directories:
+            for page in index_pages:
+                if os.path.join(path, page) in self.files:
+                    return os.path.join(path, page)
+            return None
+        root, ext = os.path.splitext(path)
+        if ext in ('.html', '') and root + '.md' in self.files:
+            return root + '.md'
+        return None
+
+    def check(self, page, link):
+        """Why a relative link from page is broken, or None if it's fine."""
+        url = urllib.parse.urlsplit(link)
+        path = urllib.parse.unquote(url.path)
+        if not path:
+            target = page
+        else:
+            if path.startswith('/'):
+                path = os.path.normpath(path.lstrip('/'))
+            else:
+                path = os.path.normpath(os.path.join(os.path.dirname(page), path))
+            if path == '.':
+                path = ''
+            if path.startswith('..'):
+                return 'outside of the site'
+            target = self.target(path)
+            if target is None:
+                return 'no such file'
+        fragment = urllib.parse.unquote(url.fragment)
+        if fragment and target in self.anchors and fragment not in self.anchors[target]:
+            return 'no anchor #' + fragment + ' in ' + target
+        return None
+
+def is_external(link):
+    return urllib.parse.urlsplit(link).scheme != '' or link.startswith('//')
+
+async def probe(url, timeout, redirects=5):
+    """Request url and return None if it worked, or the reason it didn't.
+    Tries a HEAD request first, then GET for servers that don't allow HEAD."""
+    for method in ('HEAD', 'GET'):
+        current = url
+        for i in range(redirects + 1):
+            parts = urllib.parse.urlsplit(current)
+            if parts.scheme not in ('http', 'https'):
+                return None
+            port = parts.port or (443 if parts.scheme == 'https' else 80)
+            path = parts.path or '/'
+            if parts.query:
+                path += '?' + parts.query
+            try:
+                reader, writer = await asyncio.wait_for(asyncio.open_connection(
+                    parts.hostname, port,
+                    ssl=ssl.create_default_context() if parts.scheme == 'https' else None), timeout)
+                try:
+                    writer.write('{} {} HTTP/1.1\r\nHost: {}\r\nUser-Agent: outreachylinkcheck\r\n'
+                                 'Connection: close\r\n\r\n'.format(method, path, parts.netloc).encode('latin-1'))
+                    await writer.drain()
+                    header = await asyncio.wait_for(reader.readuntil(b'\r\n\r\n'), timeout)
+                finally:
+                    writer.close()
+            except (OSError, ssl.SSLError, asyncio.TimeoutError, asyncio.IncompleteReadError,
+                    asyncio.LimitOverrunError, UnicodeError) as e:
+                return str(e) or type(e).__name__
+            lines = header.decode('latin-1').split('\r\n')
+            try:
+                status = int(lines[0].split()[1])
+            except (IndexError, ValueError):
+                return 'bad response: ' + lines[0]
+            location = [line.split(':', 1)[1].strip() for line in lines[1:]
+                        if line.lower().startswith('location:')]
+            if status in (301, 302, 303, 307, 308) and location:
+                current = urllib.parse.urljoin(current, location[0])
+                continue
+            break
+        else:
+            return 'too many redirects'
+        if method == 'HEAD' and status in (403, 405, 501):
+            continue
+        if status >= 400:
+            return 'HTTP ' + str(status)
+        return None
+
+async def probe_all(urls, connections, timeout):
+    semaphore = asyncio.Semaphore(connections)
+    async def limited(url):
+        async with semaphore:
+            return url, await probe(url, timeout)
+    return dict(await asyncio.gather(*[limited(url) for url in urls]))
+
+def main():
+    parser = argparse.ArgumentParser(description='Check the links in the Outreachy website without a web server')
+    parser.add_argument('site', help='Directory of the website')
+    parser.add_argument('pages', nargs='*', help='Only check the links in these pages (default: every .md and .html page)')
+    parser.add_argument('--external', help='Also check that links to other websites work', action='store_true')
+    parser.add_argument('--connections', help='Number of external links to check at once', type=int, default=16)
+    parser.add_argument('--timeout', help='Seconds to wait for an external website', type=float, default=15)
+    parser.add_argument('--jobs', help='Number of pages to parse at once', type=int, default=os.cpu_count())
+    args = parser.parse_args()
+
+    files, directories = walk_site(args.site)
+    site_pages = sorted(f for f in files if f.endswith(pages))
+    if args.pages:
+        check = [os.path.relpath(page, args.site) for page in args.pages]
+    else:
+        check = site_pages
+
+    paths = [os.path.join(args.site, page) for page in site_pages]
+    if args.jobs > 1:
+        with ProcessPoolExecutor(max_workers=args.jobs) as executor:
+            parsed = list(executor.map(parse_page, paths, chunksize=max(1, len(paths) // (args.jobs * 4))))
+    else:
+        parsed = [parse_page(path) for path in paths]
+    links = dict((page, page_links) for page, (page_links, anchors) in zip(site_pages, parsed))
+    index = siteIndex(files, directories,
+                      dict((page, anchors) for page, (page_links, anchors) in zip(site_pages, parsed)))
+
+    broken = []
+    external = {}
+    checked = 0
+    for page in check:
+        for line, link in links.get(page, []):
+            link = link.strip()
+            if not link or '{{' in link or '{%' in link:
+                # Jekyll fills these in
+                continue
+            if is_external(link):
+                scheme = urllib.parse.urlsplit(link).scheme
+                if scheme not in ignored_schemes:
+                    external.setdefault(urllib.parse.urljoin('https:', link.split('#')[0]), []).append((page, line, link))
+                continue
+            checked += 1
+            reason = index.check(page, link)
+            if reason:
+                broken.append((page, line, link, reason))
+
+    if args.external and external:
+        results = asyncio.run(probe_all(sorted(external), args.connections, args.timeout))
+        for url, reason in results.items():
+            if reason:
+                broken.extend((page, line, link, reason) for page, line, link in external[url])
+        checked += sum(len(uses) for uses in external.values())
+
+    for page, line, link, reason in sorted(broken):
+        print('{}:{}: {} ({})'.format(os.path.join(args.site, page), line, link, reason))
+    print('Checked {} links in {} pages, {} broken'.format(checked, len(check), len(broken)))
+    if not args.external and external:
+        print('Skipped {} links to other websites; use --external to check them'.format(
+            sum(len(uses) for uses in external.values())))
+    if broken:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
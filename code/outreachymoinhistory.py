@@ -0,0 +1,243 @@
+#!/usr/bin/env python3
+#
+# Copyright 2020 Sage Sharp <sharp@otter.technology>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Export the full history of the Outreachy wiki dump into git.
+#
+# outreachyconvertmoin.py only copies the current revision of each page.
+# This reads every numbered file in each page's revisions directory, with
+# the time, author and comment from the page's edit-log, and writes them
+# as one commit per revision, oldest first, in a git fast-import stream.
+# git fast-import writes the whole history in one process, instead of
+# running git commit for every revision. Pages are stored as
+# PATH/PAGENAME.moin, like outreachyconvertmoin.py --copy does.
+#
+# Import into a git repository (created if it doesn't exist):
+# $ ./outreachymoinhistory.py --repo wiki-history moin/data/pages
+#
+# The stream always starts the branch over, so running it again after the
+# wiki changed replaces the branch with the full, updated history. If the
+# branch is checked out in an existing repository, run git reset --hard
+# there afterwards to update the files.
+#
+# Or write the stream to use elsewhere (--force lets it replace an
+# existing branch):
+# $ ./outreachymoinhistory.py moin/data/pages > wiki.fi
+# $ git fast-import --force < wiki.fi
+#
+# Each line of a MoinMoin 1.x edit-log is tab separated:
+# timestamp (microseconds) revision action pagename ip host userid extra comment
+# Revisions that are in the edit-log but have no revision file are page
+# deletions. Revisions without an edit-log entry use the file's mtime.
+# With --userdir (moin's data/user directory), user ids are turned into
+# the names and emails of the wiki accounts. Edits without a user id are
+# committed as Anonymous; the IP address and host fields are never read,
+# so editors' addresses don't end up in the published history.
+
+import argparse
+import os
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+def read_edit_log(pagedir):
+    """Map of revision number -> (timestamp, action, userid, comment)."""
+    log = {}
+    try:
+        logfile = open(os.path.join(pagedir, 'edit-log'), 'r', encoding='utf-8', errors='replace')
+    except (FileNotFoundError, NotADirectoryError):
+        return log
+    with logfile:
+        for line in logfile:
+            fields = line.rstrip('\n').split('\t')
+            if len(fields) < 3 or not fields[1].isdigit():
+                continue
+            action = fields[2]
+            # Attachment changes are logged with revision 99999999.
+            if not action.startswith('SAVE'):
+                continue
+            try:
+                timestamp = int(fields[0])
+            except ValueError:
+                continue
+            # Old wikis logged seconds; MoinMoin 1.5 and later log microseconds.
+            if timestamp > 100000000000:
+                timestamp = timestamp // 1000000
+            fields.extend([''] * (9 - len(fields)))
+            log[int(fields[1])] = (timestamp, action, fields[6], fields[8])
+    return log
+
+def page_revisions(pagedir):
+    """The (timestamp, revision, revision file or None, action, userid,
+    comment) of every revision of a page."""
+    log = read_edit_log(pagedir)
+    revisions = []
+    files = {}
+    try:
+        with os.scandir(os.path.join(pagedir, 'revisions')) as entries:
+            for entry in entries:
+                if entry.name.isdigit():
+                    files[int(entry.name)] = entry
+    except (FileNotFoundError, NotADirectoryError):
+        pass
+    for revision in sorted(set(files) | set(log)):
+        entry = files.get(revision)
+        if revision in log:
+            timestamp, action, userid, comment = log[revision]
+        else:
+            timestamp, action, userid, comment = int(entry.stat().st_mtime), 'SAVE', '', ''
+        revisions.append((timestamp, revision, entry.path if entry else None,
+                          action, userid, comment))
+    return revisions
+
+def page_path(pagename):
+    """Where a page is stored in git, like outreachyconvertmoin.py --copy."""
+    paths = pagename.split('(2f)')
+    return '/'.join(paths[:-1] + [paths[-1] + '.moin'])
+
+def read_users(userdir):
+    """Map of MoinMoin user id -> (name, email) from the wiki's user files."""
+    users = {}
+    if not userdir:
+        return users
+    with os.scandir(userdir) as entries:
+        for entry in entries:
+            # User ids have dots in them, so the .trail and .bookmark
+            # files are skipped by name.
+            if not entry.is_file() or entry.name.endswith(('.trail', '.bookmark')):
+                continue
+            profile = {}
+            with open(entry.path, 'r', encoding='utf-8', errors='replace') as userfile:
+                for line in userfile:
+                    key, sep, value = line.rstrip('\n').partition('=')
+                    if sep:
+                        profile[key] = value
+            if 'name' in profile:
+                users[entry.name] = (profile['name'], profile.get('email', ''))
+    return users
+
+def ident(name, email):
+    # Names and emails can't contain the characters that delimit them.
+    for c in '<>\n':
+        name = name.replace(c, '')
+        email = email.replace(c, '')
+    return '{} <{}>'.format(name.strip() or 'Anonymous', email.strip())
+
+def author(users, userid, domain):
+    if userid in users:
+        name, email = users[userid]
+        return ident(name, email or userid + '@' + domain)
+    if userid:
+        return ident(userid, userid + '@' + domain)
+    return ident('Anonymous', 'anonymous@' + domain)
+
+def read_revision(path):
+    if path is None:
+        return None
+    with open(path, 'rb') as revfile:
+        return revfile.read()
+
+def data(payload):
+    return b'data ' + str(len(payload)).encode('ascii') + b'\n' + payload + b'\n'
+
+def write_stream(out, changes, users, branch, domain, jobs, batch=500):
+    """Write the revisions as a fast-import stream, reading the revision
+    files a batch at a time ahead of writing them. Returns the number of
+    commits written."""
+    out.write(b'feature done\n')
+    # Start the branch over, so the first revision has no parent.
+    out.write(b'reset ' + branch.encode('utf-8') + b'\n\n')
+    commits = 0
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        for start in range(0, len(changes), batch):
+            chunk = changes[start:start + batch]
+            contents = executor.map(read_revision, [change[3] for change in chunk])
+            for (timestamp, pagename, revision, path, action, userid, comment), content in zip(chunk, contents):
+                filename = page_path(pagename)
+                summary = comment.strip() or ('Delete ' if content is None else 'Edit ') + pagename.replace('(2f)', '/')
+                message = '{}\n\nMoinMoin {} of {}, revision {}\n'.format(
+                    summary, action, pagename.replace('(2f)', '/'), revision)
+                out.write(b'commit ' + branch.encode('utf-8') + b'\n')
+                out.write('committer {} {} +0000\n'.format(
+                    author(users, userid, domain), timestamp).encode('utf-8'))
+                out.write(data(message.encode('utf-8')))
+                if content is None:
+                    out.write(b'D ' + filename.encode('utf-8') + b'\n')
+                else:
+                    out.write(b'M 100644 inline ' + filename.encode('utf-8') + b'\n')
+                    out.write(data(content))
+                out.write(b'\n')
+                commits += 1
+    out.write(b'done\n')
+    return commits
+
+def main():
+    parser = argparse.ArgumentParser(description='Export the history of a moinmoin wiki dump as a git fast-import stream')
+    parser.add_argument('wikidir', help='Directory with moinmoin files')
+    parser.add_argument('--repo', help='Run git fast-import in this git repository (created if needed) instead of writing the stream to stdout')
+    parser.add_argument('--branch', help='Branch to import the history into', default='master')
+    parser.add_argument('--userdir', help="MoinMoin's data/user directory, to name the authors of each revision")
+    parser.add_argument('--domain', help='Email domain for authors without an email address', default='wiki.outreachy.org')
+    parser.add_argument('--jobs', help='Number of revision files to read at once', type=int, default=8)
+    args = parser.parse_args()
+
+    start = time.monotonic()
+    changes = []
+    pages = 0
+    with os.scandir(args.wikidir) as entries:
+        for entry in entries:
+            if not entry.is_dir():
+                continue
+            revisions = page_revisions(entry.path)
+            if revisions:
+                pages += 1
+            for timestamp, revision, path, action, userid, comment in revisions:
+                changes.append((timestamp, entry.name, revision, path, action, userid, comment))
+    # Oldest first; edits in the same second stay in page and revision order.
+    changes.sort(key=lambda change: change[:3])
+    users = read_users(args.userdir)
+    branch = args.branch if args.branch.startswith('refs/') else 'refs/heads/' + args.branch
+
+    if args.repo:
+        created = not os.path.isdir(os.path.join(args.repo, '.git'))
+        if created:
+            subprocess.run(['git', 'init', '-q', args.repo], check=True)
+        importer = subprocess.Popen(['git', 'fast-import', '--quiet', '--force'], cwd=args.repo, stdin=subprocess.PIPE)
+        try:
+            commits = write_stream(importer.stdin, changes, users, branch, args.domain, args.jobs)
+        finally:
+            importer.stdin.close()
+        if importer.wait() != 0:
+            sys.exit('git fast-import failed')
+        if created:
+            subprocess.run(['git', 'checkout', '-q', '-f', branch[len('refs/heads/'):]
+                            if branch.startswith('refs/heads/') else branch], cwd=args.repo)
+        else:
+            head = subprocess.run(['git', 'symbolic-ref', '-q', 'HEAD'], cwd=args.repo,
+                                  capture_output=True, text=True).stdout.strip()
+            if head == branch:
+                print('{} is checked out in {}; run git reset --hard there to update the files'.format(
+                    args.branch, args.repo))
+        out = sys.stdout
+    else:
+        commits = write_stream(sys.stdout.buffer, changes, users, branch, args.domain, args.jobs)
+        out = sys.stderr
+    print('Exported {} revisions of {} pages in {:.1f} seconds'.format(
+        commits, pages, time.monotonic() - start), file=out)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+// Copyright 2020 Sage Sharp <sharp@otter.technology>
+//
+// This program is free software: you can redistribute it and/or modify
+// it under the terms of the GNU General Public License as published by
+// the Free Software Foundation, either version 3 of the License, or
+// (at your option) any later version.
+//
+// This program is distributed in the hope that it will be useful,
+// but WITHOUT ANY WARRANTY; without even the implied warranty of
+// MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+// GNU General Public License for more details.
+//
+// You should have received a copy of the GNU General Public License
+// along with this program.  If not, see <http://www.gnu.org/licenses/>.
+//
+// Search the index written by outreachysearchindex.py. It's copied into
+// the website's search directory next to the index:
+//
+//   <script src="/search/outreachysearch.js"></script>
+//   outreachySearch('mentor "project ideas"').then(function (results) {
+//     // [{url: '/Outreachy/Mentors.html', title: 'Mentors', score: 7}, ...]
+//   });
+//
+// Pages must contain every word of the query, and every "quoted phrase".
+// Only index.json and the shards of the query's words are downloaded.
+
+var outreachySearch = (function () {
+  var script = document.currentScript;
+  var searchdir = new URL('.', script ? script.src : location.href);
+  var root = new URL('..', searchdir);
+  var stopwords = new Set(('a an and are as at be but by for from has have if in into is it its ' +
+    'of on or so that the their then there these this to was were will with you your').split(' '));
+  var index = null;
+  var shards = {};
+
+  function fetchJSON(name) {
+    return fetch(new URL(name, searchdir)).then(function (response) {
+      if (!response.ok) {
+        throw new Error('Could not load ' + name + ': ' + response.status);
+      }
+      return response.json();
+    });
+  }
+
+  // Must match fnv1a() in outreachysearchindex.py.
+  function fnv1a(word) {
+    var h = 0x811c9dc5;
+    new TextEncoder().encode(word).forEach(function (b) {
+      h = Math.imul(h ^ b, 0x01000193) >>> 0;
+    });
+    return h;
+  }
+
+  function words(text) {
+    return (text.normalize('NFC').toLowerCase().match(/[\p{L}\p{N}_]+/gu) || []);
+  }
+
+  function indexed(word) {
+    return Array.from(word).length > 1 && !stopwords.has(word);
+  }
+
+  function shard(word) {
+    var number = fnv1a(word) % index.shards;
+    if (!(number in shards)) {
+      shards[number] = fetchJSON('shard-' + String(number).padStart(2, '0') + '.json');
+    }
+    return shards[number];
+  }
+
+  // page id -> positions of word, undoing the gaps
+  function postings(word) {
+    return shard(word).then(function (terms) {
+      var pages = new Map();
+      (terms[word] || []).forEach(function (posting) {
+        var positions = [];
+        var position = 0;
+        for (var i = 1; i < posting.length; i++) {
+          position += posting[i];
+          positions.push(position);
+        }
+        pages.set(posting[0], positions);
+      });
+      return pages;
+    });
+  }
+
+  function hasPhrase(phrase, found, page) {
+    // The phrase's words at consecutive positions, allowing for the stop
+    // words that aren't indexed.
+    var first = phrase.find(indexed);
+    if (first === undefined) {
+      return true;
+    }
+    var offset = phrase.indexOf(first);
+    return found[first].get(page).some(function (start) {
+      return phrase.every(function (word, i) {
+        return !indexed(word) || found[word].get(page).indexOf(start - offset + i) >= 0;
+      });
+    });
+  }
+
+  return function (query) {
+    var phrases = [];
+    query = query.replace(/"([^"]*)"/g, function (match, phrase) {
+      phrases.push(words(phrase));
+      return ' ' + phrase + ' ';
+    });
+    var terms = Array.from(new Set(words(query).filter(indexed)));
+    return (index ? Promise.resolve(index) : fetchJSON('index.json')).then(function (loaded) {
+      index = loaded;
+      return Promise.all(terms.map(postings));
+    }).then(function (lists) {
+      if (!terms.length) {
+        return [];
+      }
+      var found = {};
+      terms.forEach(function (word, i) { found[word] = lists[i]; });
+      lists.sort(function (a, b) { return a.size - b.size; });
+      var results = [];
+      lists[0].forEach(function (positions, page) {
+        if (!lists.every(function (list) { return list.has(page); })) {
+          return;
+        }
+        if (!phrases.every(function (phrase) { return hasPhrase(phrase, found, page); })) {
+          return;
+        }
+        var entry = index.pages[page];
+        results.push({
+          url: new URL(entry[0], root).pathname,
+          title: entry[1],
+          score: lists.reduce(function (score, list) { return score + list.get(page).length; }, 0)
+        });
+      });
+      return results.sort(function (a, b) { return b.score - a.score; });
+    });
+  };
+})();
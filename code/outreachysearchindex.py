@@ -0,0 +1,231 @@
+#!/usr/bin/env python3
+#
+# Copyright 2020 Sage Sharp <sharp@otter.technology>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Build a full-text search index for the static website.
+#
+# Every Markdown page in the website directory is split into words, and
+# an inverted index of word -> pages and the positions of the word in
+# them is written to WEBSITEDIR/search as static JSON files:
+#
+#   index.json         the number of shards, and the URL and title of each page id
+#   shard-NN.json      {word: [[page id, position, gap to next position, ...], ...]}
+#   outreachysearch.js loads index.json, and then only the shards a query needs
+#
+# Each word is in shard fnv1a(word) % shards, so the browser can find it
+# without loading the rest of the index. Positions are stored as gaps,
+# which keeps the shards small. Run this after outreachyconvertmoin.py
+# --markdowndir has copied the pages in (or pass --searchindex to it):
+#
+# $ ./outreachysearchindex.py website
+#
+# The build is incremental: the hash of each page and the shards it's in
+# are kept in WEBSITEDIR/search/.state.json, and only the shards of pages
+# that were added, changed or removed are rewritten.
+
+import argparse
+import filecmp
+import hashlib
+import json
+import os
+import re
+import shutil
+import unicodedata
+from concurrent.futures import ProcessPoolExecutor
+
+stopwords = set('''a an and are as at be but by for from has have if in into is it its
+of on or so that the their then there these this to was were will with you your'''.split())
+word_pattern = re.compile(r'\w+')
+# Link targets, images, HTML tags and attributes aren't words on the page.
+markup_pattern = re.compile(r'\]\([^)]*\)|<[^>]*>|\{[.#][^}]*\}')
+# Link targets in titles, which can have parentheses in them, e.g. Wikipedia links.
+link_target_pattern = re.compile(r'\]\((?:[^()]|\([^()]*\))*\)')
+title_pattern = re.compile(r'^#{1,6}[ \t]+(.*?)[ \t#]*$|^(\S[^\n]*)\n(?:=+|-+)[ \t]*$', re.MULTILINE)
+
+def fnv1a(word):
+    """32 bit FNV-1a hash of the UTF-8 bytes of a word. outreachysearch.js
+    computes the same hash to find the shard a word is in."""
+    h = 0x811c9dc5
+    for byte in word.encode('utf-8'):
+        h = ((h ^ byte) * 0x01000193) & 0xffffffff
+    return h
+
+def tokenize(text):
+    """The indexed words of the text, and their positions. Stop words count
+    towards positions, so phrases can be matched, but aren't indexed."""
+    # The same word can be written with precomposed or combining accents;
+    # outreachysearch.js normalizes queries to NFC too.
+    text = unicodedata.normalize('NFC', text)
+    words = {}
+    for position, match in enumerate(word_pattern.finditer(markup_pattern.sub(' ', text).lower())):
+        word = match.group(0)
+        if len(word) < 2 or word in stopwords:
+            continue
+        words.setdefault(word, []).append(position)
+    return words
+
+def page_title(text, path):
+    match = title_pattern.search(text)
+    if match:
+        title = link_target_pattern.sub(']', match.group(1) or match.group(2))
+        return unicodedata.normalize('NFC', re.sub(r'[*_`\[\]]', '', title)).strip()
+    return os.path.splitext(os.path.basename(path))[0]
+
+def page_url(page):
+    # Jekyll publishes foo.md as foo.html.
+    return os.path.splitext(page)[0].replace(os.sep, '/') + '.html'
+
+def read_page(path):
+    with open(path, 'rb') as pagefile:
+        content = pagefile.read()
+    return hashlib.sha1(content).hexdigest(), content.decode('utf-8', 'replace')
+
+def index_page(path):
+    """The hash, title and words of a page."""
+    digest, text = read_page(path)
+    return digest, page_title(text, path), tokenize(text)
+
+def find_pages(websitedir):
+    pages = []
+    for dirpath, dirnames, filenames in os.walk(websitedir):
+        dirnames[:] = sorted(d for d in dirnames if not d.startswith(('.', '_')) and d != 'search')
+        pages.extend(os.path.relpath(os.path.join(dirpath, f), websitedir) for f in sorted(filenames) if f.endswith('.md'))
+    return pages
+
+def write_json(path, value):
+    with open(path + '.tmp', 'w') as jsonfile:
+        json.dump(value, jsonfile, separators=(',', ':'), sort_keys=True)
+    os.replace(path + '.tmp', path)
+
+def shard_path(searchdir, shard):
+    return os.path.join(searchdir, 'shard-{:02d}.json'.format(shard))
+
+def build_index(websitedir, shards=64, jobs=1):
+    """Update the search index in websitedir/search for the pages that
+    changed since the last build. Returns (pages indexed, pages removed,
+    shards written)."""
+    searchdir = os.path.join(websitedir, 'search')
+    os.makedirs(searchdir, exist_ok=True)
+    statepath = os.path.join(searchdir, '.state.json')
+    state = {'shards': shards, 'next': 0, 'pages': {}}
+    if os.path.exists(statepath):
+        with open(statepath, 'r') as statefile:
+            state = json.load(statefile)
+        if state['shards'] != shards:
+            # Every word moves to a different shard; start over.
+            for shard in range(state['shards']):
+                if os.path.exists(shard_path(searchdir, shard)):
+                    os.remove(shard_path(searchdir, shard))
+            state = {'shards': shards, 'next': 0, 'pages': {}}
+
+    # Like outreachyconvertmoin.py --copy, pages with the same size and
+    # mtime as the last build aren't read again, and pages that were only
+    # touched aren't tokenized again.
+    pages = find_pages(websitedir)
+    changed = []
+    for page in pages:
+        path = os.path.join(websitedir, page)
+        stat = os.stat(path)
+        entry = state['pages'].get(page)
+        if entry and entry['size'] == stat.st_size and entry['mtime'] == stat.st_mtime_ns:
+            continue
+        if entry and entry['hash'] == read_page(path)[0]:
+            entry.update({'size': stat.st_size, 'mtime': stat.st_mtime_ns})
+            continue
+        changed.append((page, path, stat))
+    removed = set(state['pages']) - set(pages)
+
+    if jobs > 1 and len(changed) > 1:
+        with ProcessPoolExecutor(max_workers=jobs) as executor:
+            indexed = list(executor.map(index_page, [path for page, path, stat in changed],
+                                        chunksize=max(1, len(changed) // (jobs * 4))))
+    else:
+        indexed = [index_page(path) for page, path, stat in changed]
+
+    # Postings to drop (page ids) and add, by shard.
+    stale = {}
+    postings = {}
+    for page in list(removed) + [page for page, path, stat in changed]:
+        entry = state['pages'].get(page)
+        if entry:
+            for shard in entry['shards']:
+                stale.setdefault(shard, set()).add(entry['id'])
+    for page in removed:
+        del state['pages'][page]
+    for (page, path, stat), (digest, title, words) in zip(changed, indexed):
+        entry = state['pages'].get(page)
+        if entry is None:
+            entry = {'id': state['next']}
+            state['next'] += 1
+        entry.update({'hash': digest, 'size': stat.st_size, 'mtime': stat.st_mtime_ns, 'title': title})
+        state['pages'][page] = entry
+        pageshards = set()
+        for word, positions in words.items():
+            shard = fnv1a(word) % shards
+            pageshards.add(shard)
+            gaps = [positions[0]] + [b - a for a, b in zip(positions, positions[1:])]
+            postings.setdefault(shard, {}).setdefault(word, []).append([entry['id']] + gaps)
+        entry['shards'] = sorted(pageshards)
+
+    # Shards are only written if their contents changed, so a page that was
+    # edited without changing its words leaves them alone. Every shard
+    # exists, even if it's empty, so the browser never gets a 404.
+    written = 0
+    for shard in range(shards):
+        path = shard_path(searchdir, shard)
+        text = None
+        if os.path.exists(path):
+            if shard not in stale and shard not in postings:
+                continue
+            with open(path, 'r') as shardfile:
+                text = shardfile.read()
+        index = json.loads(text) if text else {}
+        drop = stale.get(shard, set())
+        if drop:
+            for word in list(index):
+                index[word] = [posting for posting in index[word] if posting[0] not in drop]
+                if not index[word]:
+                    del index[word]
+        for word, wordpostings in postings.get(shard, {}).items():
+            index[word] = sorted(index.get(word, []) + wordpostings)
+        if json.dumps(index, separators=(',', ':'), sort_keys=True) != text:
+            write_json(path, index)
+            written += 1
+
+    if changed or removed or not os.path.exists(os.path.join(searchdir, 'index.json')):
+        write_json(os.path.join(searchdir, 'index.json'), {
+            'shards': shards,
+            'pages': dict((str(entry['id']), [page_url(page), entry['title']])
+                          for page, entry in state['pages'].items()),
+        })
+    script = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'outreachysearch.js')
+    if not os.path.exists(os.path.join(searchdir, 'outreachysearch.js')) or not filecmp.cmp(
+            script, os.path.join(searchdir, 'outreachysearch.js'), shallow=False):
+        shutil.copyfile(script, os.path.join(searchdir, 'outreachysearch.js'))
+    write_json(statepath, state)
+    return len(changed), len(removed), written
+
+def main():
+    parser = argparse.ArgumentParser(description='Build a static full-text search index for the Outreachy website')
+    parser.add_argument('websitedir', help='Directory of the website Markdown pages')
+    parser.add_argument('--shards', help='Number of files to split the index into', type=int, default=64)
+    parser.add_argument('--jobs', help='Number of pages to index at once', type=int, default=os.cpu_count())
+    args = parser.parse_args()
+    indexed, removed, written = build_index(args.websitedir, args.shards, args.jobs)
+    print('Indexed', indexed, 'changed pages, removed', removed, 'pages, and wrote', written, 'of', args.shards, 'shards')
+
+if __name__ == "__main__":
+    main()
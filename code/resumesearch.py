@@ -33,6 +33,8 @@ import textwrap
 from enum import Enum
 from collections import Counter
 from shutil import copyfile
+from emailsend import add_send_arguments, send_drafts
+from outreachcontacts import add_contacts_arguments, open_contacts
 
 class outreachyProject:
     """Outreachy project name, description, keywords, and matching resume storage."""
@@ -497,8 +499,10 @@ def craftEmail(emaildir, resume, boothlist, strength):
                  moreInfo)
     ext = '-email.txt'
 
-    with open(os.path.join(emaildir, os.path.splitext(resume.textFileName)[0] + ext), 'w') as f:
+    path = os.path.join(emaildir, os.path.splitext(resume.textFileName)[0] + ext)
+    with open(path, 'w') as f:
         f.write(email)
+    return path
 
 def createFormEmails(directory, resumeFiles, boothlist):
     # For all resumes with one strong match or multiple strong matches with the same organization:
@@ -518,6 +522,7 @@ def createFormEmails(directory, resumeFiles, boothlist):
         if firstMatch:
             oneStrong.append(resume)
     left = [resume for resume in resumeFiles if resume not in oneStrong]
+    drafts = []
     print('Resumes with exactly one match or multiple matches with same org:', len(oneStrong))
     print('Other resumes:', len(left))
 
@@ -536,7 +541,7 @@ def createFormEmails(directory, resumeFiles, boothlist):
             except:
                 print('Could not find pdf file for', resume.textFileName)
                 continue
-            craftEmail(dirpath, resume, boothlist, emailType.strong)
+            drafts.append(craftEmail(dirpath, resume, boothlist, emailType.strong))
 
     # For all resumes with strong matches with multiple orgs (but less than 4 orgs):
     # Create a directory called strong-mixed.
@@ -560,7 +565,7 @@ def createFormEmails(directory, resumeFiles, boothlist):
         except:
             print('Could not find pdf file for', resume.textFileName)
             continue
-        craftEmail(dirpath, resume, boothlist, emailType.mixed)
+        drafts.append(craftEmail(dirpath, resume, boothlist, emailType.mixed))
 
     # For all resumes with strong matches with 4 or more orgs:
     # Create a directory called strong-scattered.
@@ -579,6 +584,7 @@ def createFormEmails(directory, resumeFiles, boothlist):
     # Take the top N keywords that weakly matched, find all projects that matched those keywords.
     # "Based on your resume, it looks like you might be interested in Outreachy
     # projects involving $KEYWORD like $MATCHES"
+    return drafts
 
 def craftGenericEmail(emaildir, resume):
     if not resume.emails:
@@ -590,8 +596,10 @@ def craftGenericEmail(emaildir, resume):
     email = (email + generalInfo + moreInfo)
     ext = '-email.txt'
 
-    with open(os.path.join(emaildir, os.path.splitext(resume.textFileName)[0] + ext), 'w') as f:
+    path = os.path.join(emaildir, os.path.splitext(resume.textFileName)[0] + ext)
+    with open(path, 'w') as f:
         f.write(email)
+    return path
 
 def main():
     parser = argparse.ArgumentParser(description='Search text resume files for skillset matches.')
@@ -601,9 +609,21 @@ def main():
     parser.add_argument('--done', help='Directory with .txt resume files that have been contacted')
     parser.add_argument('--generic', help='Simply create generic emails and ignore project matches', default=False)
     #parser.add_argument('matches', help='file to write potential matches to')
+    add_send_arguments(parser)
+    add_contacts_arguments(parser)
     args = parser.parse_args()
     resumeFiles = readResumeFiles(args.dir)
 
+    # Leave out people who were already emailed by another mailing this round.
+    store = open_contacts(args)
+    if store:
+        store.add((email for resume in resumeFiles for email in resume.emails), 'resumes')
+        emailed = [resume for resume in resumeFiles
+                   if any(store.emailed(email) for email in resume.emails)]
+        if emailed:
+            print('Skipped', len(emailed), 'resumes of people who were already emailed this round')
+        resumeFiles = [resume for resume in resumeFiles if resume not in emailed]
+
     # Check to see if we have resumes to process that we've already
     # send email to.
     if args.done:
@@ -621,8 +641,14 @@ def main():
         genericdir = os.path.join(args.dir, 'generic-todo')
         if not os.path.exists(genericdir):
             os.makedirs(genericdir)
+        drafts = []
         for resume in resumeFiles:
-            craftGenericEmail(genericdir, resume)
+            drafts.append(craftGenericEmail(genericdir, resume))
+            if store and resume.emails:
+                store.written(resume.emails[0], drafts[-1])
+        send_drafts(args, drafts, store.on_result if store else None)
+        if store:
+            store.close()
         return
 
     boothstops = (searchForEmail(args.csv, resumeFiles) +
@@ -646,7 +672,16 @@ def main():
     print('People who stopped by the booth who have a resume and may be non-U.S. citizens:',
           len([resume for resume in notusResumes
                if resume.pdfFileName in boothlist]))
-    createFormEmails(args.dir, resumeFiles, boothlist, generic)
+    drafts = createFormEmails(args.dir, resumeFiles, boothlist, generic)
+    if store:
+        resumes = dict((os.path.splitext(resume.textFileName)[0] + '-email.txt', resume) for resume in resumeFiles)
+        for path in drafts:
+            resume = resumes[os.path.basename(path)]
+            if resume.emails:
+                store.written(resume.emails[0], path)
+    send_drafts(args, drafts, store.on_result if store else None)
+    if store:
+        store.close()
 
 if __name__ == "__main__":
     main()
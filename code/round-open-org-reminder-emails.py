@@ -14,20 +14,22 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
+from emailtemplate import emailTemplate
+
 # input file is from the Outreachy wiki, in the form
 # || Org || Status || email <email@example.com> || person's title || Possible sponsors || Confirmed sponsors || Notes ||
 
 email = '''
 From: Sarah Sharp <saharabeara@gmail.com>
-To: {contact}
+To: {{contact}}
 Cc: outreachy-admins@gnome.org
-Subject: {project} participation in Outreachy?
+Subject: {{project}} participation in Outreachy?
 
-Hi {names},
+Hi {{names}},
 
 The Outreachy program is looking for organizations to participate in
-round 13.  Do you think {project} would be willing to participate again?
-The round will open on September 12, and the sooner {project} is listed,
+round 13.  Do you think {{project}} would be willing to participate again?
+The round will open on September 12, and the sooner {{project}} is listed,
 the more likely you'll get strong applicants.
 
 Sarah Sharp
@@ -94,6 +96,7 @@ On Sat, Aug 27, 2016 at 4:41 PM, Sarah A Sharp <sarah@thesharps.us> wrote:
 > Sarah Sharp
 >
 '''.strip()
+template = emailTemplate(email)
 
 with open('to-ping.csv', 'r') as contactsFile:
     for line in contactsFile:
@@ -103,4 +106,4 @@ with open('to-ping.csv', 'r') as contactsFile:
         # Assumes email addresses are of the form "First Last <email>, First Last <email>"
         names = " and ".join([(fullName.strip().split(" ")[0]) for fullName in contacts.split(", ")])
         with open("ping/ping-" + project + ".txt", 'w') as draft:
-            draft.write(email.format(project = project, contact = contacts, names = names))
+            draft.write(template.render({'project': project, 'contact': contacts, 'names': names}))
@@ -18,6 +18,9 @@
 import argparse
 import csv
 import os
+from emailsend import add_send_arguments, send_drafts
+from emailtemplate import content_hash, draftManifest, draft_filename
+from outreachcontacts import add_contacts_arguments, open_contacts, split_address
 
 header1 = '''From: Sage Sharp <applicant-help@outreachy.org>
 '''
@@ -81,17 +84,20 @@ Sage Sharp
 Outreachy Organizer
 '''
 
-def write_email(outdir, index, contact, body):
-    with open(os.path.join(outdir, str(index) + '.txt'), 'w') as email:
+def write_email(path, contact, body):
+    with open(path, 'w') as email:
         email.write(header1)
         email.write('To: ' + contact + '\n')
         email.write(header3)
         email.write(body)
+    return path
 
 def main():
     parser = argparse.ArgumentParser(description='Send an email to people who stopped by the Outreachy booth at Tapia')
     parser.add_argument('outdir', help='Directory to create form emails in')
     parser.add_argument('csv', help='CSV file of people who stopped by the booth')
+    add_send_arguments(parser)
+    add_contacts_arguments(parser)
     args = parser.parse_args()
 
     if not os.path.exists(args.outdir):
@@ -106,14 +112,54 @@ def main():
             if row['Email'] and row['Which Outreachy round do you want to apply for?,May 2019 to August 2019'] == '1':
                 applicants.append('"' + row['Name'].strip() + '" <' + row['Email'].strip() + '>')
             elif row['Email'] and row["Do you want to help promote Outreachy to students at your university?"] == '1':
-                promotor.append('"' + row['Name'].strip() + '" <' + row['Email'].strip() + '>')
-
-    for index, contact in enumerate(applicants):
-        write_email(args.outdir, index, contact, body)
-    for index, contact in enumerate(promoter):
-        write_email(args.outdir, index, contact, promote_body)
-
-    print('Wrote', len(applicants + promoter), 'resume draft emails to', args.outdir)
+                promoter.append('"' + row['Name'].strip() + '" <' + row['Email'].strip() + '>')
+
+    store = open_contacts(args)
+    if store:
+        store.add(applicants + promoter, 'tapia')
+
+    # Only drafts whose contact or email text changed since the last run
+    # into outdir are rewritten.
+    manifest = draftManifest(args.outdir)
+    drafts = []
+    drafted = set()
+    written = 0
+    skipped = 0
+    duplicates = 0
+    for contacts, prefix, text in ((applicants, '', body), (promoter, 'promote-', promote_body)):
+        template = content_hash(header1, header3, text)
+        for contact in contacts:
+            # Drafts are named by email address, so people who signed up
+            # twice only get one email.
+            path = os.path.join(args.outdir, draft_filename(split_address(contact)[1], prefix))
+            if path in drafted:
+                duplicates += 1
+                continue
+            drafted.add(path)
+            if store and store.emailed(contact):
+                skipped += 1
+                continue
+            if not manifest.unchanged(path, content_hash(contact), template):
+                write_email(path, contact, text)
+                manifest.wrote(path, content_hash(contact), template)
+                written += 1
+            drafts.append(path)
+            if store:
+                store.written(contact, path)
+    removed = manifest.save()
+
+    print('Wrote', written, 'resume draft emails to', args.outdir)
+    if written < len(drafts):
+        print(len(drafts) - written, 'drafts were unchanged since the last run')
+    if removed:
+        print('Removed', removed, 'drafts for people who are no longer on the list')
+    if skipped:
+        print('Skipped', skipped, 'people who were already emailed this round')
+    if duplicates:
+        print('Skipped', duplicates, 'people who were on the list more than once')
+    send_drafts(args, drafts, store.on_result if store else None)
+    if store:
+        store.close()
 
 if __name__ == "__main__":
     main()
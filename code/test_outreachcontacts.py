@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+#
+# Copyright 2020 Sage Sharp <sharp@otter.technology>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Tests for which recipients the contacts database counts as already
+# emailed. Run with:
+#
+# $ python3 -m pytest test_outreachcontacts.py
+
+from outreachcontacts import contactStore
+
+alum = '"Alum Person" <alum@example.com>'
+
+def send(store, draft):
+    store.add([alum], 'alums')
+    store.written(alum, draft)
+    store.on_result(draft, 'sent')
+
+def test_later_stage_is_not_skipped(tmp_path):
+    db = str(tmp_path / 'contacts.db')
+    first = contactStore(db, 'longitudinalsurveyemail.py', '2020-05', 'reminder 0')
+    send(first, 'out0/0.txt')
+    assert first.emailed(alum)
+    first.close()
+
+    reminder = contactStore(db, 'longitudinalsurveyemail.py', '2020-05', 'reminder 1')
+    assert not reminder.emailed(alum)
+    send(reminder, 'out1/0.txt')
+    assert reminder.emailed(alum)
+    reminder.close()
+
+def test_other_campaign_is_skipped(tmp_path):
+    db = str(tmp_path / 'contacts.db')
+    tapia = contactStore(db, 'tapiaemail.py', '2020-05')
+    tapia.add([alum], 'tapia')
+    tapia.written(alum, 'tapia/0.txt')
+    # A draft this campaign wrote but didn't send can be written again.
+    assert not tapia.emailed(alum)
+    tapia.close()
+
+    alums = contactStore(db, 'longitudinalsurveyemail.py', '2020-05', 'reminder 0')
+    assert alums.emailed(alum)
+    alums.close()
+
+    next_round = contactStore(db, 'longitudinalsurveyemail.py', '2020-12', 'reminder 0')
+    assert not next_round.emailed(alum)
+    next_round.close()